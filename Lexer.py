@@ -1,170 +1,319 @@
+import bisect
+import codecs
+import mmap
+import os
+import re
+import sys
 from Tokeniser import *
 
+KEYWORDS = {
+    "class": CLASS, "extends": EXTENDS, "new": NEW, "print": PRINT, "if": IF,
+    "while": WHILE, "return": RETURN, "function": FUNCTION,
+    "true": TRUE, "false": FALSE, "null": NULL, "and": AND, "or": OR, "not": NOT
+}
+
+OPERATORS = {
+    '==': EQ, '!=': NE, '<=': LE, '>=': GE,
+    '{': LBRACE, '}': RBRACE, '(': LPAREN, ')': RPAREN,
+    '=': EQUALS, '!': NOT, '<': LT, '>': GT,
+    ',': COMMA, '+': PLUS, '-': MINUS, '*': MULTIPLY, '/': DIVIDE,
+    '.': DOT, ';': SEMI
+}
+
+# One master pattern for the whole scanner: leading whitespace and comments
+# are consumed together with the token that follows them, and the
+# alternative that matches decides the token kind.
+TOKEN_PATTERN = re.compile(r'''
+    (?:\s+|//[^\n]*|/\*.*?(?:\*/|\Z))*
+    (?:
+    (?P<NUMBER>\d[\d.]*)
+  | (?P<STRING>"[^"]*"?)
+  | (?P<NAME>[^\W\d]\w*)
+  | (?P<OP>==|!=|<=|>=|[{}()=!<>,+\-*/.;])
+    )?
+''', re.VERBOSE | re.DOTALL)
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def read_chunks(source, chunk_size):
+    # Yields the source as str chunks; bytes from paths, binary files and
+    # mmaps go through an incremental UTF-8 decoder so multi-byte
+    # characters may straddle chunk boundaries. Paths are read in binary
+    # so that neither the locale nor newline translation changes offsets.
+    if isinstance(source, os.PathLike):
+        with open(source, 'rb') as file:
+            yield from read_chunks(file, chunk_size)
+        return
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    if isinstance(source, mmap.mmap):
+        for offset in range(0, len(source), chunk_size):
+            yield decoder.decode(source[offset:offset + chunk_size])
+        yield decoder.decode(b'', final=True)
+        return
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+    yield decoder.decode(b'', final=True)
+
+
 class Lexer:
-    def __init__(self, text):
-        self.text = text
+    # source is either the program text or a path, file object or mmap
+    # that is lexed in chunks of chunk_size characters. A non-strict lexer
+    # turns invalid characters into ERROR tokens instead of raising.
+    def __init__(self, source, chunk_size=CHUNK_SIZE, strict=True):
         self.pos = 0
-        self.current_char = self.text[0] if text else None
-    
-    def advance(self):
-        self.pos += 1
-        if self.pos >= len(self.text):
-            self.current_char = None
+        self.chunk_size = chunk_size
+        self.strict = strict
+        if isinstance(source, str):
+            self.text = source
+            self._chunks = None
+        else:
+            self.text = ''
+            self._chunks = read_chunks(source, chunk_size)
+        # Absolute offset, line number and line start of text[0]; text only
+        # holds the unconsumed tail of a streamed source.
+        self._base = 0
+        self._base_line = 1
+        self._line_start = 0
+        self._stream = None
+        self._eof = None
+
+    def _refill(self, pos, wanted):
+        # Drops the consumed text[:pos] and appends at least wanted more
+        # characters, or whatever is left of the source.
+        text = self.text
+        newlines = text.count('\n', 0, pos)
+        if newlines:
+            self._base_line += newlines
+            self._line_start = self._base + text.rfind('\n', 0, pos) + 1
+        self._base += pos
+        parts = [text[pos:]]
+        size = 0
+        for chunk in self._chunks:
+            parts.append(chunk)
+            size += len(chunk)
+            if size >= wanted:
+                break
         else:
-            self.current_char = self.text[self.pos]
-    
-    def skip_whitespace(self):
-        while self.current_char is not None and self.current_char.isspace():
-            self.advance()
-    
-    def skip_comment(self):
-        if self.current_char == '/' and self.peek() == '/':
-            while self.current_char is not None and self.current_char != '\n':
-                self.advance()
-        elif self.current_char == '/' and self.peek() == '*':
-            self.advance()
-            self.advance()
-            while self.current_char is not None:
-                if self.current_char == '*' and self.peek() == '/':
-                    self.advance()
-                    self.advance()
+            self._chunks = None
+        self.text = ''.join(parts)
+
+    def tokenize(self):
+        match = TOKEN_PATTERN.match
+        intern = sys.intern
+        text = self.text
+        end = len(text)
+        pos = self.pos - self._base
+        while True:
+            m = match(text, pos)
+            if m.end() == end and self._chunks is not None:
+                # The match may continue past the buffered text (a longer
+                # name, a two-character operator, an open comment or
+                # string), so pull in more input and scan it again. Tokens
+                # longer than a chunk double the read size each time.
+                self._refill(pos, max(self.chunk_size, end - pos))
+                text = self.text
+                end = len(text)
+                pos = 0
+                continue
+            kind = m.lastgroup
+            base = self._base
+            if kind is None:
+                pos = m.end()
+                self.pos = base + pos
+                if pos == end:
                     break
-                self.advance()
-    
-    def peek(self):
-        peek_pos = self.pos + 1
-        if peek_pos >= len(self.text):
+                if self.strict:
+                    raise Exception(f"Invalid character: {text[pos]}")
+                pos += 1
+                self.pos = base + pos
+                yield Token(ERROR, text[pos - 1], self.pos - 1, self.pos)
+                continue
+            pos = m.end()
+            self.pos = base + pos
+            start = base + m.start(kind)
+            value = m.group(kind)
+            if kind == 'NAME':
+                value = intern(value)
+                yield Token(KEYWORDS.get(value, IDENTIFIER), value, start, self.pos)
+            elif kind == 'OP':
+                yield Token(OPERATORS[value], value, start, self.pos)
+            elif kind == 'NUMBER':
+                try:
+                    number = float(value) if '.' in value else int(value)
+                except ValueError:
+                    if self.strict:
+                        raise
+                    yield Token(ERROR, value, start, self.pos)
+                    continue
+                yield Token(NUMBER, number, start, self.pos)
+            else:
+                yield Token(STRING, value[1:-1] if value.endswith('"') and len(value) > 1 else value[1:], start, self.pos)
+        yield Token(EOF, None, self.pos, self.pos)
+
+    def tokenize_all(self):
+        return list(self.tokenize())
+
+    def position(self, offset):
+        # Only offsets that are still buffered can be mapped for a streamed
+        # source; the current token always is.
+        relative = offset - self._base
+        if relative < 0:
             return None
-        return self.text[peek_pos]
-    
-    def read_number(self):
-        num_str = ""
-        while self.current_char is not None and (self.current_char.isdigit() or self.current_char == '.'):
-            num_str += self.current_char
-            self.advance()
-        return float(num_str) if '.' in num_str else int(num_str)
-    
-    def read_string(self):
-        value = ""
-        self.advance()
-        while self.current_char is not None and self.current_char != '"':
-            value += self.current_char
-            self.advance()
-        self.advance()
-        return value
-    
-    def read_identifier(self):
-        value = ""
-        while self.current_char is not None and (self.current_char.isalnum() or self.current_char == '_'):
-            value += self.current_char
-            self.advance()
-        return value
-    
+        text = self.text
+        line = self._base_line + text.count('\n', 0, relative)
+        newline = text.rfind('\n', 0, relative)
+        line_start = self._base + newline + 1 if newline >= 0 else self._line_start
+        return line, offset - line_start + 1
+
     def get_next_token(self):
-        while self.current_char is not None:
-            if self.current_char.isspace():
-                self.skip_whitespace()
-                continue
-            
-            if self.current_char == '/' and (self.peek() == '/' or self.peek() == '*'):
-                self.skip_comment()
-                continue
-            
-            if self.current_char.isdigit():
-                return Token(NUMBER, self.read_number())
-            
-            if self.current_char == '"':
-                return Token(STRING, self.read_string())
-            
-            if self.current_char.isalpha() or self.current_char == '_':
-                value = self.read_identifier()
-                keywords = {
-                    "class": CLASS, "new": NEW, "print": PRINT, "if": IF,
-                    "while": WHILE, "return": RETURN, "function": FUNCTION,
-                    "true": TRUE, "false": FALSE, "null": NULL, "and": AND, "or": OR, "not": NOT
-                }
-                return Token(keywords.get(value, IDENTIFIER), value)
-            
-            if self.current_char == '{':
-                self.advance()
-                return Token(LBRACE, '{')
-            
-            if self.current_char == '}':
-                self.advance()
-                return Token(RBRACE, '}')
-            
-            if self.current_char == '=':
-                if self.peek() == '=':
-                    self.advance()
-                    self.advance()
-                    return Token(EQ, '==')
-                else:
-                    self.advance()
-                    return Token(EQUALS, '=')
-            
-            if self.current_char == '!':
-                if self.peek() == '=':
-                    self.advance()
-                    self.advance()
-                    return Token(NE, '!=')
-                else:
-                    self.advance()
-                    return Token(NOT, '!')
-            
-            if self.current_char == '<':
-                if self.peek() == '=':
-                    self.advance()
-                    self.advance()
-                    return Token(LE, '<=')
-                else:
-                    self.advance()
-                    return Token(LT, '<')
-            
-            if self.current_char == '>':
-                if self.peek() == '=':
-                    self.advance()
-                    self.advance()
-                    return Token(GE, '>=')
-                else:
-                    self.advance()
-                    return Token(GT, '>')
-            
-            if self.current_char == '(':
-                self.advance()
-                return Token(LPAREN, '(')
-            
-            if self.current_char == ')':
-                self.advance()
-                return Token(RPAREN, ')')
-            
-            if self.current_char == ',':
-                self.advance()
-                return Token(COMMA, ',')
-            
-            if self.current_char == '+':
-                self.advance()
-                return Token(PLUS, '+')
-            
-            if self.current_char == '-':
-                self.advance()
-                return Token(MINUS, '-')
-            
-            if self.current_char == '*':
-                self.advance()
-                return Token(MULTIPLY, '*')
-            
-            if self.current_char == '/':
-                self.advance()
-                return Token(DIVIDE, '/')
-            
-            if self.current_char == '.':
-                self.advance()
-                return Token(DOT, '.')
-            
-            if self.current_char == ';':
-                self.advance()
-                return Token(SEMI, ';')
-            
-            raise Exception(f"Invalid character: {self.current_char}")
-        
-        return Token(EOF, None)
\ No newline at end of file
+        if self._eof is not None:
+            return self._eof
+        if self._stream is None:
+            self._stream = self.tokenize()
+        token = next(self._stream)
+        if token.type == EOF:
+            self._eof = token
+        return token
+
+
+def edit_range(old, new):
+    # Returns (start, old_end, new_end) of the span that differs between two
+    # versions of a buffer, found by binary search on the common prefix and
+    # suffix. Each probe copies only the piece of old it checks and lets
+    # startswith/endswith compare it in place in new.
+    limit = min(len(old), len(new))
+    low, high = 0, limit
+    while low < high:
+        mid = (low + high + 1) // 2
+        if new.startswith(old[low:mid], low):
+            low = mid
+        else:
+            high = mid - 1
+    start = low
+    low, high = 0, limit - start
+    while low < high:
+        mid = (low + high + 1) // 2
+        if new.endswith(old[len(old) - mid:len(old) - low], 0, len(new) - low):
+            low = mid
+        else:
+            high = mid - 1
+    return start, len(old) - low, len(new) - low
+
+
+class IncrementalLexer:
+    # Keeps the token stream of an editor buffer and, after an edit,
+    # re-lexes from the last token that ends before the edit until the new
+    # tokens line up with the old ones again.
+    #
+    # Every token after an edit moves by the same amount, so the move is
+    # kept pending instead of written into them: tokens from index _moved
+    # on are stored _shift characters before their place in the text.
+    # An edit only settles the tokens between it and the previous edit,
+    # and the re-lexed tokens are spliced into the list in place.
+    # start_of/end_of give true offsets; tokens settles the whole list.
+    def __init__(self, text=''):
+        self.text = ''
+        self._tokens = []
+        self._moved = 0
+        self._shift = 0
+        self.update(text)
+
+    @property
+    def tokens(self):
+        self._settle(len(self._tokens))
+        self._moved = self._shift = 0
+        return self._tokens
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def start_of(self, index):
+        token = self._tokens[index]
+        return token.start + self._shift if index >= self._moved else token.start
+
+    def end_of(self, index):
+        token = self._tokens[index]
+        return token.end + self._shift if index >= self._moved else token.end
+
+    def slice(self, first, last):
+        # tokens[first:last] with true offsets
+        self._settle(last)
+        return self._tokens[first:last]
+
+    def _settle(self, index):
+        # Writes the pending shift into the tokens before index
+        moved = self._moved
+        if index <= moved:
+            return
+        shift = self._shift
+        if shift:
+            tokens = self._tokens
+            for position in range(moved, index):
+                token = tokens[position]
+                token.start += shift
+                token.end += shift
+        self._moved = index
+
+    def _find(self, offset, key):
+        # bisect_left by true offset: the settled tokens as stored, the
+        # rest against offset less the pending shift
+        tokens = self._tokens
+        moved = self._moved
+        index = bisect.bisect_left(tokens, offset, 0, moved, key=key)
+        if index == moved:
+            index = bisect.bisect_left(tokens, offset - self._shift, moved, key=key)
+        return index
+
+    def update(self, text, start=None, old_end=None, new_end=None):
+        # Returns the (first, last) slice of tokens that was re-lexed.
+        if start is None:
+            start, old_end, new_end = edit_range(self.text, text)
+        delta = new_end - old_end
+        tokens = self._tokens
+        first = self._find(start, token_end)
+        index = self._find(old_end, token_start)
+        self._settle(first)
+        lexer = Lexer(text, strict=False)
+        lexer.pos = tokens[first - 1].end if first else 0
+        fresh = []
+        reuse = len(tokens)
+        for token in lexer.tokenize():
+            if token.type == EOF:
+                break
+            if token.start >= new_end:
+                while index < reuse and self.start_of(index) + delta < token.start:
+                    index += 1
+                if index < reuse and self.start_of(index) + delta == token.start \
+                        and self.end_of(index) + delta == token.end:
+                    # Same span of unchanged text: everything after it
+                    # lexes exactly as before.
+                    reuse = index
+                    break
+            fresh.append(token)
+        # The kept tail moves by delta. Its settled part, left between here
+        # and an earlier edit further on, takes the pending shift off so
+        # that the whole tail is stored against the new one.
+        shift = self._shift
+        if shift:
+            for position in range(reuse, self._moved):
+                token = tokens[position]
+                token.start -= shift
+                token.end -= shift
+        tokens[first:reuse] = fresh
+        self._moved = first + len(fresh)
+        self._shift = shift + delta
+        self.text = text
+        return first, first + len(fresh)
+
+
+def token_start(token):
+    return token.start
+
+
+def token_end(token):
+    return token.end
@@ -1,45 +1,60 @@
 class Token:
-    def __init__(self, token_type, value):
+    __slots__ = ('type', 'value', 'start', 'end')
+
+    def __init__(self, token_type, value, start=0, end=0):
         self.type = token_type
         self.value = value
+        self.start = start
+        self.end = end
     
     def __repr__(self):
-        return f"Token({self.type}, {self.value})"
+        return f"Token({TOKEN_NAMES[self.type]}, {self.value})"
+
+# Token types are small integer codes so the parser compares ints;
+# TOKEN_NAMES maps a code back to its name for messages.
+CLASS = 0
+IDENTIFIER = 1
+EXTENDS = 2
+SUPER = 3
+LBRACE = 4
+RBRACE = 5
+LPAREN = 6
+RPAREN = 7
+EQUALS = 8
+DOT = 9
+NEW = 10
+PRINT = 11
+IF = 12
+WHILE = 13
+RETURN = 14
+FUNCTION = 15
+NUMBER = 16
+STRING = 17
+SEMI = 18
+COMMA = 19
+PLUS = 20
+MINUS = 21
+MULTIPLY = 22
+DIVIDE = 23
+EQ = 24
+NE = 25
+LT = 26
+GT = 27
+LE = 28
+GE = 29
+AND = 30
+OR = 31
+NOT = 32
+TRUE = 33
+FALSE = 34
+NULL = 35
+EOF = 36
+ERROR = 37
 
-CLASS = "CLASS"
-IDENTIFIER = "IDENTIFIER"
-EXTENDS = "EXTENDS"
-SUPER = "SUPER"
-LBRACE = "LBRACE"
-RBRACE = "RBRACE"
-LPAREN = "LPAREN"
-RPAREN = "RPAREN"
-EQUALS = "EQUALS"
-DOT = "DOT"
-NEW = "NEW"
-PRINT = "PRINT"
-IF = "IF"
-WHILE = "WHILE"
-RETURN = "RETURN"
-FUNCTION = "FUNCTION"
-NUMBER = "NUMBER"
-STRING = "STRING"
-SEMI = "SEMI"
-COMMA = "COMMA"
-PLUS = "PLUS"
-MINUS = "MINUS"
-MULTIPLY = "MULTIPLY"
-DIVIDE = "DIVIDE"
-EQ = "EQ"
-NE = "NE"
-LT = "LT"
-GT = "GT"
-LE = "LE"
-GE = "GE"
-AND = "AND"
-OR = "OR"
-NOT = "NOT"
-TRUE = "TRUE"
-FALSE = "FALSE"
-NULL = "NULL"
-EOF = "EOF"
\ No newline at end of file
+TOKEN_NAMES = (
+    "CLASS", "IDENTIFIER", "EXTENDS", "SUPER", "LBRACE", "RBRACE", "LPAREN",
+    "RPAREN", "EQUALS", "DOT", "NEW", "PRINT", "IF", "WHILE", "RETURN",
+    "FUNCTION", "NUMBER", "STRING", "SEMI", "COMMA", "PLUS", "MINUS",
+    "MULTIPLY", "DIVIDE", "EQ", "NE", "LT", "GT", "LE", "GE", "AND", "OR",
+    "NOT", "TRUE", "FALSE", "NULL", "EOF", "ERROR",
+)
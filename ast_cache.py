@@ -0,0 +1,179 @@
+import hashlib
+import marshal
+import mmap
+import os
+from pathlib import Path
+from Lexer import Lexer
+from parser import Parser
+from nodes import NODE_TYPES
+from interpreter import __version__
+
+MAGIC = b'OOPC'
+CACHE_SUFFIX = '.oopc'
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Opcodes of the serialised form. A program is stored in post-order as a
+# byte string of opcodes plus a parallel tuple of arguments: CONST pushes
+# its argument, LIST collects the last n values into a list and NODE builds
+# NODE_TYPES[n] from the last len(_fields) values.
+CONST, LIST, NODE = 0, 1, 2
+
+# Changing the node classes or their fields invalidates every entry.
+SCHEMA = ';'.join(f"{cls.__name__}({','.join(cls._fields)})" for cls in NODE_TYPES)
+CACHE_TAG = f"{__version__}|{SCHEMA}".encode()
+
+
+def encode(nodes):
+    kinds = {cls: index for index, cls in enumerate(NODE_TYPES)}
+    codes = bytearray()
+    args = []
+    stack = [(nodes, False)]
+    while stack:
+        value, done = stack.pop()
+        if done:
+            if isinstance(value, list):
+                codes.append(LIST)
+                args.append(len(value))
+            else:
+                codes.append(NODE)
+                args.append(kinds[type(value)])
+        elif isinstance(value, list):
+            stack.append((value, True))
+            stack.extend((item, False) for item in reversed(value))
+        elif type(value) in kinds:
+            stack.append((value, True))
+            stack.extend((getattr(value, field), False) for field in reversed(value._fields))
+        else:
+            codes.append(CONST)
+            args.append(value)
+    return marshal.dumps((bytes(codes), tuple(args)))
+
+
+def decode(data):
+    codes, args = marshal.loads(data)
+    stack = []
+    for code, arg in zip(codes, args):
+        if code == CONST:
+            stack.append(arg)
+        elif code == LIST:
+            start = len(stack) - arg
+            items = stack[start:]
+            del stack[start:]
+            stack.append(items)
+        else:
+            cls = NODE_TYPES[arg]
+            start = len(stack) - len(cls._fields)
+            node = cls(*stack[start:])
+            del stack[start:]
+            stack.append(node)
+    return stack[0]
+
+
+class ASTCache:
+    # Parsed programs stored under directory as <digest>.oopc, keyed by a
+    # hash of the source, the interpreter version and the node schema.
+    # Loading refreshes an entry's mtime, and the least recently used
+    # entries are removed once the directory grows past max_bytes.
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Parse errors of the last parse(), for the caller to report
+        self.errors = []
+
+    def key(self, source):
+        digest = hashlib.blake2b(CACHE_TAG, digest_size=20)
+        if isinstance(source, str):
+            digest.update(source.encode())
+        else:
+            with open(source, 'rb') as file:
+                for chunk in iter(lambda: file.read(1 << 16), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return self.directory / (key + CACHE_SUFFIX)
+
+    def load(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file, \
+                    mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:len(MAGIC)] != MAGIC:
+                    raise ValueError(f"Bad cache entry: {path}")
+                with memoryview(data)[len(MAGIC):] as view:
+                    nodes = decode(view)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError, TypeError, IndexError):
+            self.discard(path)
+            return None
+        return nodes
+
+    def store(self, key, nodes):
+        try:
+            data = MAGIC + encode(nodes)
+        except ValueError:
+            return
+        path = self.path(key)
+        temp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(temp, 'wb') as file:
+                file.write(data)
+            os.replace(temp, path)
+        except OSError:
+            # A read-only or full cache directory only costs the speedup
+            self.discard(temp)
+            return
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for path in self.directory.glob('*' + CACHE_SUFFIX):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self.discard(path)
+            total -= size
+
+    def discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def lookup(self, source):
+        # Returns (key, nodes), nodes being None on a miss; the caller
+        # parses and stores under key itself.
+        key = self.key(source)
+        nodes = self.load(key)
+        if nodes is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return key, nodes
+
+    def parse(self, source):
+        # source is program text or a path; only programs that parsed
+        # without errors are stored, so cached runs report the same errors.
+        key, nodes = self.lookup(source)
+        if nodes is not None:
+            self.errors = []
+            return nodes
+        parser = Parser(Lexer(source))
+        nodes = parser.parse()
+        self.errors = parser.errors
+        if not parser.errors:
+            self.store(key, nodes)
+        return nodes
@@ -0,0 +1,96 @@
+import contextlib
+import io
+import time
+from Lexer import Lexer
+from parser import Parser
+from interpreter import Interpreter
+from flat_ast import FlatInterpreter
+from vm import VirtualMachine
+from closures import ClosureInterpreter
+from transpiler import TranspiledInterpreter
+from benchmarks.bench_dispatch import SCRIPTS as LOOP_SCRIPTS
+
+BACKENDS = {
+    'tree': Interpreter,
+    'flat': FlatInterpreter,
+    'vm': VirtualMachine,
+    'closure': ClosureInterpreter,
+    'python': TranspiledInterpreter,
+}
+
+# Loop-heavy scripts plus method-call-heavy and string-building ones
+SCRIPTS = dict(LOOP_SCRIPTS, **{
+    'recursive fib': '''
+        class Math {
+            function fib(n) {
+                if (n < 2) { return n; }
+                return this.fib(n - 1) + this.fib(n - 2);
+            }
+        }
+        m = new Math;
+        print m.fib(20);
+    ''',
+    'method calls in a loop': '''
+        class Counter {
+            count = 0;
+            function add(n) {
+                this.count = this.count + n;
+                return this.count;
+            }
+        }
+        c = new Counter;
+        i = 0;
+        while (i < 20000) {
+            c.add(i);
+            i = i + 1;
+        }
+        print c.count;
+    ''',
+    'string building': '''
+        class Report {
+            function build(n) {
+                text = "";
+                i = 0;
+                while (i < n) {
+                    text = text + "row;";
+                    i = i + 1;
+                }
+                return text;
+            }
+        }
+        r = new Report;
+        report = r.build(20000);
+        print report == r.build(20000);
+    ''',
+})
+
+
+def run(backend, nodes):
+    interpreter = BACKENDS[backend]()
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        interpreter.interpret(nodes)
+    return time.perf_counter() - start, output.getvalue()
+
+
+def main(repeat=5):
+    for name, source in SCRIPTS.items():
+        nodes = Parser(Lexer(source)).parse()
+        baseline, expected = run('tree', nodes)
+        print(f"{name}:")
+        for backend in BACKENDS:
+            timings = []
+            for _ in range(repeat):
+                elapsed, output = run(backend, nodes)
+                if output != expected:
+                    raise AssertionError(f"{backend} output differs on {name!r}: {output!r} != {expected!r}")
+                timings.append(elapsed)
+            best = min(timings)
+            if backend == 'tree':
+                baseline = best
+            print(f"  {backend:<7} {best * 1000:8.1f} ms  ({baseline / best:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import contextlib
+import io
+import time
+from Lexer import Lexer
+from parser import Parser
+from interpreter import Interpreter, RuntimeError
+
+# Loop-heavy scripts where per-node dispatch dominates
+SCRIPTS = {
+    'arithmetic loop': '''
+        i = 0;
+        total = 0;
+        while (i < 50000) {
+            total = total + i * 2 - 1;
+            i = i + 1;
+        }
+        print total;
+    ''',
+    'nested loops': '''
+        i = 0;
+        count = 0;
+        while (i < 200) {
+            j = 0;
+            while (j < 200) {
+                if (j > i) { count = count + 1; }
+                j = j + 1;
+            }
+            i = i + 1;
+        }
+        print count;
+    ''',
+}
+
+
+class GetattrDispatchInterpreter(Interpreter):
+    # The previous visit(): build the method name and getattr per node
+    def visit(self, node):
+        if node is None:
+            return None
+        
+        method_name = f"visit_{type(node).__name__}"
+        method = getattr(self, method_name, None)
+        if method is None:
+            raise RuntimeError(f"No visit method for {type(node).__name__}")
+        return method(node)
+
+
+class CountingInterpreter(Interpreter):
+    def __init__(self):
+        super().__init__()
+        self.visits = 0
+    
+    def visit(self, node):
+        self.visits += 1
+        return super().visit(node)
+
+
+def run(interpreter_class, nodes):
+    interpreter = interpreter_class()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        interpreter.interpret(nodes)
+    return time.perf_counter() - start, interpreter
+
+
+def best_of(interpreter_class, nodes, repeat):
+    return min(run(interpreter_class, nodes)[0] for _ in range(repeat))
+
+
+def main(repeat=5):
+    for name, source in SCRIPTS.items():
+        nodes = Parser(Lexer(source)).parse()
+        visits = run(CountingInterpreter, nodes)[1].visits
+        before = best_of(GetattrDispatchInterpreter, nodes, repeat)
+        after = best_of(Interpreter, nodes, repeat)
+        saved = (before - after) / visits * 1e9
+        print(f"{name}: {visits:,} node visits")
+        print(f"  getattr dispatch: {before * 1000:8.1f} ms  ({before / visits * 1e9:6.0f} ns/node)")
+        print(f"  table dispatch:   {after * 1000:8.1f} ms  ({after / visits * 1e9:6.0f} ns/node)")
+        print(f"  saved per node:   {saved:8.0f} ns  ({before / after:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
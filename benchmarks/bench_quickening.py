@@ -0,0 +1,76 @@
+import contextlib
+import io
+import time
+from Lexer import Lexer
+from parser import Parser
+from interpreter import Interpreter
+from benchmarks.bench_backends import SCRIPTS as BACKEND_SCRIPTS
+
+# Loops whose arithmetic and comparisons see one operand type throughout,
+# plus one whose operand types change halfway and deoptimise
+SCRIPTS = {
+    'arithmetic loop': BACKEND_SCRIPTS['arithmetic loop'],
+    'nested loops': BACKEND_SCRIPTS['nested loops'],
+    'float loop': '''
+        i = 0;
+        x = 0.5;
+        while (i < 20000) {
+            x = x * 0.5 + 1.25 - 0.75;
+            i = i + 1;
+        }
+        print x;
+    ''',
+    'type change': '''
+        class Adder {
+            function add(a, b) { return a + b; }
+        }
+        adder = new Adder;
+        i = 0;
+        total = 0;
+        text = "";
+        while (i < 10000) {
+            total = adder.add(total, i);
+            i = i + 1;
+        }
+        while (i < 12000) {
+            text = adder.add("x", "y");
+            i = i + 1;
+        }
+        print total;
+        print text;
+    ''',
+}
+
+
+def run(quicken, nodes):
+    interpreter = Interpreter(quicken=quicken)
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        interpreter.interpret(nodes)
+    return time.perf_counter() - start, output.getvalue(), interpreter.quickening
+
+
+def best_of(quicken, nodes, repeat):
+    timings = []
+    for _ in range(repeat):
+        elapsed, output, stats = run(quicken, nodes)
+        timings.append(elapsed)
+    return min(timings), output, stats
+
+
+def main(repeat=5):
+    for name, source in SCRIPTS.items():
+        nodes = Parser(Lexer(source)).parse()
+        before, expected, _ = best_of(False, nodes, repeat)
+        after, output, stats = best_of(True, nodes, repeat)
+        if output != expected:
+            raise AssertionError(f"output differs on {name!r}: {output!r} != {expected!r}")
+        print(f"{name}:")
+        print(f"  generic:   {before * 1000:8.1f} ms")
+        print(f"  quickened: {after * 1000:8.1f} ms  ({before / after:.2f}x)  "
+              f"{stats['specialised']} specialised, {stats['deopts']} deopts")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import contextlib
+import io
+import time
+from Lexer import Lexer
+from parser import Parser
+from interpreter import Interpreter, ReturnException
+from benchmarks.bench_backends import SCRIPTS as BACKEND_SCRIPTS
+
+# Call-heavy scripts where every call ends in a return
+SCRIPTS = {
+    'recursive fib': BACKEND_SCRIPTS['recursive fib'],
+    'method calls in a loop': BACKEND_SCRIPTS['method calls in a loop'],
+    'early return from a loop': '''
+        class Search {
+            function first(limit) {
+                i = 0;
+                while (i < 100) {
+                    if (i * i > limit) { return i; }
+                    i = i + 1;
+                }
+                return -1;
+            }
+        }
+        s = new Search;
+        n = 0;
+        total = 0;
+        while (n < 2000) {
+            total = total + s.first(n);
+            n = n + 1;
+        }
+        print total;
+    ''',
+}
+
+
+class ExceptionReturnInterpreter(Interpreter):
+    # The previous return: raise ReturnException and catch it in the call
+    def visit_MethodCallNode(self, node):
+        obj = self.visit(node.object)
+        method = self.cached_method(node.cache or self.site_cache(node, node.method_name), obj)
+        arguments = [self.visit(arg) for arg in node.arguments]
+        method_env = method.bind(arguments, obj, self.frame_layout(method.body))
+
+        previous_env = self.current_env
+        self.current_env = method_env
+        try:
+            for stmt in method.body:
+                self.visit(stmt)
+            return None
+        except ReturnException as ret:
+            return ret.value
+        finally:
+            self.current_env = previous_env
+
+    def visit_IfNode(self, node):
+        body = node.then_body if self.is_truthy(self.visit(node.condition)) else node.else_body
+        result = None
+        for stmt in body or ():
+            result = self.visit(stmt)
+        return result
+
+    def visit_WhileNode(self, node):
+        result = None
+        while self.is_truthy(self.visit(node.condition)):
+            for stmt in node.body:
+                result = self.visit(stmt)
+        return result
+
+    def visit_ReturnNode(self, node):
+        raise ReturnException(self.visit(node.expression) if node.expression else None)
+
+
+def run(interpreter_class, nodes):
+    interpreter = interpreter_class()
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        interpreter.interpret(nodes)
+    return time.perf_counter() - start, output.getvalue()
+
+
+def best_of(interpreter_class, nodes, repeat):
+    timings = []
+    for _ in range(repeat):
+        elapsed, output = run(interpreter_class, nodes)
+        timings.append(elapsed)
+    return min(timings), output
+
+
+def main(repeat=5):
+    for name, source in SCRIPTS.items():
+        nodes = Parser(Lexer(source)).parse()
+        before, expected = best_of(ExceptionReturnInterpreter, nodes, repeat)
+        after, output = best_of(Interpreter, nodes, repeat)
+        if output != expected:
+            raise AssertionError(f"output differs on {name!r}: {output!r} != {expected!r}")
+        print(f"{name}:")
+        print(f"  ReturnException: {before * 1000:8.1f} ms")
+        print(f"  Completion:      {after * 1000:8.1f} ms  ({before / after:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
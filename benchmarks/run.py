@@ -0,0 +1,187 @@
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+from Lexer import Lexer
+from parser import Parser
+from compiler import walk
+from interpreter import Interpreter
+from output import CollectingSink
+from benchmarks.bench_backends import BACKENDS
+
+# Times the lexer, the parser and a backend's interpret separately on every
+# workload and reports throughput; --json writes the results so runs on
+# different commits can be compared.
+#
+#   python -m benchmarks.run [--backend vm] [--repeat 5] [--json out.json]
+
+WORKLOADS = Path(__file__).parent / 'workloads'
+
+# Statements in the generated 'huge source' workload
+HUGE_STATEMENTS = 20000
+
+
+def huge_source(statements=HUGE_STATEMENTS):
+    # A long, flat program: classes, assignments, arithmetic, ifs and short
+    # loops repeated with fresh names, so lexing and parsing dominate
+    lines = []
+    for k in range(statements // 10):
+        lines.append(f"class Item{k} {{ value = {k}; function get(n) {{ return this.value + n * {k % 7}; }} }}")
+        lines.append(f"item{k} = new Item{k};")
+        lines.append(f"a{k} = item{k}.get({k}) * 2 - {k} / 4;")
+        lines.append(f"s{k} = \"item \" + \"{k}\";")
+        lines.append(f"b{k} = a{k} + 1;")
+        lines.append(f"if (a{k} > {k}) {{ b{k} = a{k} - 1; }}")
+        lines.append(f"i{k} = 0;")
+        lines.append(f"while (i{k} < 3) {{ i{k} = i{k} + 1; }}")
+        lines.append(f"c{k} = b{k} == a{k} or i{k} != 3;")
+        lines.append(f"d{k} = (a{k} + b{k}) * (i{k} - 1) and not c{k};")
+    lines.append("print a1 + b1;")
+    return '\n'.join(lines) + '\n'
+
+
+def workloads():
+    sources = {path.stem: path.read_text() for path in sorted(WORKLOADS.glob('*.oop'))}
+    sources['huge source'] = huge_source()
+    return sources
+
+
+class PrelexedLexer(Lexer):
+    # Hands the parser tokens lexed beforehand, so parsing is timed alone
+    def __init__(self, source, tokens):
+        super().__init__(source)
+        self.tokens = tokens
+
+    def tokenize(self):
+        return iter(self.tokens)
+
+
+class CountingInterpreter(Interpreter):
+    # Counts node evaluations, the "ops" of ops/s. Every backend is
+    # measured against the tree walker's count for the same program.
+    def __init__(self):
+        super().__init__(quicken=False, output=CollectingSink())
+        self.ops = 0
+        for node_type, method in list(self.dispatch.items()):
+            self.dispatch[node_type] = self.counted(method)
+
+    def counted(self, method):
+        def visit(node):
+            self.ops += 1
+            return method(node)
+        return visit
+
+
+def best_of(repeat, action):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = action()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def peak_memory(action):
+    tracemalloc.start()
+    try:
+        action()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(name, source, backend, repeat):
+    lex_time, tokens = best_of(repeat, lambda: Lexer(source).tokenize_all())
+    parsers = []
+
+    def parse():
+        parsers.append(Parser(PrelexedLexer(source, tokens)))
+        return parsers[-1].parse()
+
+    parse_time, nodes = best_of(repeat, parse)
+    if parsers[-1].errors:
+        raise AssertionError(f"{name!r} does not parse: {parsers[-1].errors[0]}")
+    node_count = sum(1 for _ in walk(nodes))
+
+    counter = CountingInterpreter()
+    counter.interpret(nodes)
+    expected = counter.output.getvalue()
+
+    def interpret():
+        output = CollectingSink()
+        BACKENDS[backend](output=output).interpret(nodes)
+        return output.getvalue()
+
+    run_time, output = best_of(repeat, interpret)
+    if output != expected:
+        raise AssertionError(f"{backend} output differs on {name!r}: {output!r} != {expected!r}")
+
+    return {
+        'workload': name,
+        'backend': backend,
+        'source_bytes': len(source.encode()),
+        'tokens': len(tokens),
+        'nodes': node_count,
+        'ops': counter.ops,
+        'lex_seconds': lex_time,
+        'parse_seconds': parse_time,
+        'interpret_seconds': run_time,
+        'tokens_per_second': len(tokens) / lex_time if lex_time else None,
+        'nodes_per_second': node_count / parse_time if parse_time else None,
+        'ops_per_second': counter.ops / run_time if run_time else None,
+        'peak_lex_bytes': peak_memory(lambda: Lexer(source).tokenize_all()),
+        'peak_parse_bytes': peak_memory(lambda: Parser(Lexer(source)).parse()),
+        'peak_interpret_bytes': peak_memory(interpret),
+    }
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Lexer, parser and interpreter throughput")
+    arg_parser.add_argument('--backend', choices=sorted(BACKENDS), default='tree')
+    arg_parser.add_argument('--repeat', type=int, default=3, help="best of this many runs per phase")
+    arg_parser.add_argument('--workload', action='append', help="run only these workloads")
+    arg_parser.add_argument('--json', metavar='PATH', help="write the results as JSON")
+    args = arg_parser.parse_args(argv)
+
+    sources = workloads()
+    names = args.workload or list(sources)
+    results = []
+    print(f"{'workload':<14} {'lex ms':>9} {'tokens/s':>11} {'parse ms':>9} {'nodes/s':>11} "
+          f"{'run ms':>9} {'ops/s':>11} {'peak KiB':>9}")
+    for name in names:
+        result = measure(name, sources[name], args.backend, args.repeat)
+        results.append(result)
+        peak = max(result['peak_lex_bytes'], result['peak_parse_bytes'], result['peak_interpret_bytes'])
+        print(f"{name:<14} {result['lex_seconds'] * 1000:>9.1f} {result['tokens_per_second']:>11,.0f} "
+              f"{result['parse_seconds'] * 1000:>9.1f} {result['nodes_per_second']:>11,.0f} "
+              f"{result['interpret_seconds'] * 1000:>9.1f} {result['ops_per_second']:>11,.0f} "
+              f"{peak / 1024:>9,.0f}")
+
+    if args.json:
+        report = {
+            'commit': commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'backend': args.backend,
+            'repeat': args.repeat,
+            'results': results,
+        }
+        Path(args.json).write_text(json.dumps(report, indent=2) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+from nodes import *
+from environment import MISSING, UNBOUND
+from interpreter import Interpreter, Completion, ReturnException, RuntimeError, RETURN, BREAK, CONTINUE, DEPTH_ERROR
+from compiler import walk
+from rope import concat
+
+CONSTANT_NODES = (NumberNode, StringNode, BooleanNode, NullNode)
+
+# Statements that can hand back a Completion; blocks without one skip the
+# check after every statement
+ABRUPT_NODES = (ReturnNode, ClassNode)
+
+
+def can_complete(statements):
+    return any(isinstance(node, ABRUPT_NODES) for node in walk(statements))
+
+
+def binary_closures(is_truthy):
+    # Operator -> (generic, constant right operand) closure makers. Each
+    # maker takes the compiled operands and returns fn(env).
+    def divide(left, right):
+        def fn(env):
+            value = left(env)
+            divisor = right(env)
+            if divisor == 0:
+                raise RuntimeError("Division by zero")
+            return value / divisor
+        return fn
+
+    # Both operands are always evaluated, as in Interpreter.binary_op
+    def logical_and(left, right):
+        def fn(env):
+            value = left(env)
+            other = right(env)
+            return is_truthy(value) and is_truthy(other)
+        return fn
+
+    def logical_or(left, right):
+        def fn(env):
+            value = left(env)
+            other = right(env)
+            return value if is_truthy(value) else other
+        return fn
+
+    def divide_constant(left, divisor):
+        if divisor == 0:
+            return divide(left, lambda env: divisor)
+        return lambda env: left(env) / divisor
+
+    def add_constant(left, constant):
+        # Appending a string literal can start a Rope
+        if type(constant) is str:
+            return lambda env: concat(left(env), constant)
+        return lambda env: left(env) + constant
+
+    return {
+        '+': (lambda l, r: lambda env: l(env) + r(env), add_constant),
+        '-': (lambda l, r: lambda env: l(env) - r(env), lambda l, c: lambda env: l(env) - c),
+        '*': (lambda l, r: lambda env: l(env) * r(env), lambda l, c: lambda env: l(env) * c),
+        '/': (divide, divide_constant),
+        '==': (lambda l, r: lambda env: l(env) == r(env), lambda l, c: lambda env: l(env) == c),
+        '!=': (lambda l, r: lambda env: l(env) != r(env), lambda l, c: lambda env: l(env) != c),
+        '<': (lambda l, r: lambda env: l(env) < r(env), lambda l, c: lambda env: l(env) < c),
+        '>': (lambda l, r: lambda env: l(env) > r(env), lambda l, c: lambda env: l(env) > c),
+        '<=': (lambda l, r: lambda env: l(env) <= r(env), lambda l, c: lambda env: l(env) <= c),
+        '>=': (lambda l, r: lambda env: l(env) >= r(env), lambda l, c: lambda env: l(env) >= c),
+        'and': (logical_and, None),
+        'or': (logical_or, None),
+    }
+
+
+class ClosureInterpreter(Interpreter):
+    # Turns every node into a Python closure once, fn(env) -> value, with
+    # its operator and children already resolved, then runs the closures.
+    # env is the current Environment; the closures keep current_env in step
+    # with it so create_object and class definitions see the same scope.
+    # Method bodies are compiled on first call and cached by body.
+    def __init__(self, optimise=False, resolve=True, output=None):
+        super().__init__(optimise, resolve, quicken=False, output=output)
+        self.binary = binary_closures(self.is_truthy)
+        self.method_bodies = {}
+
+    def run(self, nodes):
+        result = None
+        try:
+            for fn in self.compile_block(nodes):
+                value = fn(self.current_env)
+                if type(value) is Completion:
+                    raise ReturnException(value.value)
+                result = value
+        except RuntimeError as e:
+            self.write(f"Runtime Error: {e.message}")
+        except RecursionError:
+            self.write(f"Runtime Error: {DEPTH_ERROR}")
+        return result
+
+    def compile_block(self, statements):
+        return tuple(self.compile(stmt) for stmt in statements)
+
+    def body_for(self, method):
+        # (compiled body, frame layout or None)
+        entry = self.method_bodies.get(id(method.body))
+        if entry is None:
+            entry = self.method_bodies[id(method.body)] = (
+                method.body, self.compile_block(method.body), self.frame_layout(method.body))
+        return entry
+
+    def compile(self, node):
+        compiler = getattr(self, f"compile_{type(node).__name__}", None)
+        if compiler is None:
+            # Class and method definitions and anything else without a
+            # compiled form run on the tree walker
+            return lambda env: self.visit(node)
+        return compiler(node)
+
+    def compile_NumberNode(self, node):
+        value = node.value
+        return lambda env: value
+
+    compile_StringNode = compile_NumberNode
+    compile_BooleanNode = compile_NumberNode
+
+    def compile_NullNode(self, node):
+        return lambda env: None
+
+    def compile_VariableNode(self, node):
+        name = node.name
+
+        def fn(env):
+            value = env.find(name)
+            if value is MISSING:
+                raise RuntimeError(f"Undefined variable: {name}")
+            return value
+        return fn
+
+    def compile_LocalNode(self, node):
+        name = node.name
+        slot = node.slot
+        lookup = self.lookup
+
+        def fn(env):
+            value = env.values[slot]
+            if value is UNBOUND:
+                return lookup(name)
+            return value
+        return fn
+
+    def compile_AssignmentNode(self, node):
+        value = self.compile(node.value)
+        target = node.target
+
+        if isinstance(target, LocalNode):
+            slot = target.slot
+
+            def fn(env):
+                result = env.values[slot] = value(env)
+                return result
+        elif isinstance(target, VariableNode):
+            name = target.name
+
+            def fn(env):
+                result = env.store[name] = value(env)
+                return result
+        elif isinstance(target, PropertyAccessNode):
+            obj = self.compile(target.object)
+            name = target.property
+            set_property = self.set_property
+
+            def fn(env):
+                result = value(env)
+                set_property(obj(env), name, result)
+                return result
+        else:
+            def fn(env):
+                value(env)
+                raise RuntimeError("Invalid assignment target")
+        return fn
+
+    def compile_BinOpNode(self, node):
+        left = self.compile(node.left)
+        makers = self.binary.get(node.operator)
+        if makers is None:
+            right = self.compile(node.right)
+            op = node.operator
+            binary_op = self.binary_op
+            return lambda env: binary_op(op, left(env), right(env))
+        generic, constant = makers
+        if constant is not None and isinstance(node.right, CONSTANT_NODES):
+            return constant(left, node.right.value)
+        return generic(left, self.compile(node.right))
+
+    def compile_UnaryOpNode(self, node):
+        operand = self.compile(node.operand)
+        op = node.operator
+        if op == '-':
+            return lambda env: -operand(env)
+        if op == 'not' or op == '!':
+            is_truthy = self.is_truthy
+            return lambda env: not is_truthy(operand(env))
+        unary_op = self.unary_op
+        return lambda env: unary_op(op, operand(env))
+
+    def compile_IfNode(self, node):
+        condition = self.compile(node.condition)
+        then_body = self.compile_block(node.then_body)
+        else_body = self.compile_block(node.else_body) if node.else_body else ()
+        is_truthy = self.is_truthy
+
+        if not can_complete([node.then_body, node.else_body]):
+            def fn(env):
+                result = None
+                for stmt in (then_body if is_truthy(condition(env)) else else_body):
+                    result = stmt(env)
+                return result
+            return fn
+
+        def fn(env):
+            result = None
+            for stmt in (then_body if is_truthy(condition(env)) else else_body):
+                result = stmt(env)
+                if type(result) is Completion:
+                    break
+            return result
+        return fn
+
+    def compile_WhileNode(self, node):
+        condition = self.compile(node.condition)
+        body = self.compile_block(node.body)
+        is_truthy = self.is_truthy
+
+        if not can_complete(node.body):
+            def fn(env):
+                result = None
+                while is_truthy(condition(env)):
+                    for stmt in body:
+                        result = stmt(env)
+                return result
+            return fn
+
+        def fn(env):
+            result = None
+            while is_truthy(condition(env)):
+                for stmt in body:
+                    value = stmt(env)
+                    if type(value) is Completion:
+                        break
+                    result = value
+                else:
+                    continue
+                if value.kind is BREAK:
+                    break
+                if value.kind is not CONTINUE:
+                    return value
+            return result
+        return fn
+
+    def compile_ReturnNode(self, node):
+        if node.expression is None:
+            return lambda env: Completion(RETURN)
+        value = self.compile(node.expression)
+        return lambda env: Completion(RETURN, value(env))
+
+    def compile_PrintNode(self, node):
+        value = self.compile(node.expression)
+        stringify = self.stringify
+        write = self.write
+
+        def fn(env):
+            result = value(env)
+            write(stringify(result))
+            return result
+        return fn
+
+    def compile_PropertyAccessNode(self, node):
+        obj = self.compile(node.object)
+        cache = self.new_cache(node.property)
+        cached_property = self.cached_property
+        return lambda env: cached_property(cache, obj(env))
+
+    def compile_ObjectCreateNode(self, node):
+        class_name = node.class_name
+        create_object = self.create_object
+        return lambda env: create_object(class_name)
+
+    def compile_MethodCallNode(self, node):
+        obj = self.compile(node.object)
+        cache = self.new_cache(node.method_name)
+        arguments = self.compile_block(node.arguments)
+        cached_method = self.cached_method
+        body_for = self.body_for
+        callers = self.callers
+
+        def fn(env):
+            instance = obj(env)
+            method = cached_method(cache, instance)
+            _, body, layout = body_for(method)
+            method_env = method.bind([argument(env) for argument in arguments], instance, layout)
+            callers.append(env)
+            self.current_env = method_env
+            try:
+                for stmt in body:
+                    result = stmt(method_env)
+                    if type(result) is Completion:
+                        return result.value
+                return None
+            finally:
+                callers.pop()
+                self.current_env = env
+        return fn
@@ -0,0 +1,297 @@
+from nodes import *
+from inline_cache import InlineCache
+
+# Opcodes. Every instruction in CodeObject.code is an (opcode, argument)
+# tuple of ints; the argument indexes constants, names, nodes, local slots
+# or inline caches, or is a jump target or argument count.
+(
+    LOAD_CONST, LOAD_NAME, STORE_NAME, LOAD_FAST, STORE_FAST,
+    ADD, SUBTRACT, MULTIPLY, DIVIDE, EQUAL, NOT_EQUAL, LESS, GREATER,
+    LESS_EQUAL, GREATER_EQUAL, AND, OR, BINARY_OP, NEGATE, NOT, UNARY_OP,
+    JUMP, POP_JUMP_IF_FALSE, POP, DUP, STORE_RESULT, COMMIT_RESULT,
+    GET_ATTR, SET_ATTR, FIND_METHOD, CALL, RETURN, NEW, PRINT,
+    EVAL_NODE, RAISE_ERROR, HALT,
+) = range(37)
+
+OPCODE_NAMES = (
+    'LOAD_CONST', 'LOAD_NAME', 'STORE_NAME', 'LOAD_FAST', 'STORE_FAST',
+    'ADD', 'SUBTRACT', 'MULTIPLY', 'DIVIDE', 'EQUAL', 'NOT_EQUAL', 'LESS', 'GREATER',
+    'LESS_EQUAL', 'GREATER_EQUAL', 'AND', 'OR', 'BINARY_OP', 'NEGATE', 'NOT', 'UNARY_OP',
+    'JUMP', 'POP_JUMP_IF_FALSE', 'POP', 'DUP', 'STORE_RESULT', 'COMMIT_RESULT',
+    'GET_ATTR', 'SET_ATTR', 'FIND_METHOD', 'CALL', 'RETURN', 'NEW', 'PRINT',
+    'EVAL_NODE', 'RAISE_ERROR', 'HALT',
+)
+
+BINARY_OPCODES = {
+    '+': ADD, '-': SUBTRACT, '*': MULTIPLY, '/': DIVIDE,
+    '==': EQUAL, '!=': NOT_EQUAL, '<': LESS, '>': GREATER,
+    '<=': LESS_EQUAL, '>=': GREATER_EQUAL, 'and': AND, 'or': OR,
+}
+
+UNARY_OPCODES = {'-': NEGATE, 'not': NOT, '!': NOT}
+
+# Nodes that capture or expose the current environment (object creation,
+# class and method definitions). A method body containing one keeps its
+# variables in a real Environment instead of local slots.
+ENV_NODES = (ObjectCreateNode, ClassNode, MethodNode)
+
+# Slots every method frame reserves ahead of its parameters
+THIS_SLOT, SUPER_SLOT = 0, 1
+
+# STORE_RESULT targets
+RESULT, PENDING = 0, 1
+
+
+class CodeObject:
+    __slots__ = ('name', 'code', 'constants', 'names', 'nodes', 'local_names',
+                 'parameter_slots', 'uses_env', 'caches')
+
+    def __init__(self, name):
+        self.name = name
+        self.code = []
+        self.constants = []
+        self.names = []
+        self.nodes = []
+        self.local_names = []
+        self.parameter_slots = []
+        self.uses_env = True
+        # One InlineCache per GET_ATTR and FIND_METHOD
+        self.caches = []
+
+    def disassemble(self):
+        lines = [f"code {self.name} (locals: {', '.join(self.local_names) or '-'})"]
+        for pc, (op, arg) in enumerate(self.code):
+            name = OPCODE_NAMES[op]
+            if op in (LOAD_CONST, BINARY_OP, UNARY_OP, RAISE_ERROR):
+                detail = repr(self.constants[arg])
+            elif op in (LOAD_NAME, STORE_NAME, SET_ATTR, NEW):
+                detail = self.names[arg]
+            elif op in (GET_ATTR, FIND_METHOD):
+                detail = self.caches[arg].name
+            elif op in (LOAD_FAST, STORE_FAST):
+                detail = self.local_names[arg]
+            elif op == EVAL_NODE:
+                detail = type(self.nodes[arg]).__name__
+            else:
+                detail = str(arg)
+            lines.append(f"{pc:6}  {name:<18} {detail}")
+        return '\n'.join(lines)
+
+
+def walk(nodes):
+    # Every node reachable from a list of statements, in no particular order
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif hasattr(node, '_fields'):
+            yield node
+            stack.extend(getattr(node, field) for field in node._fields)
+
+
+class Compiler:
+    # Compiles nodes.py trees to CodeObjects for the VirtualMachine.
+    # Top-level code reads and writes variables through the environment and
+    # records each statement's value for interpret()'s result. A method body
+    # gets a local slot for this, super, each parameter and each variable it
+    # assigns, unless it contains an ENV_NODES node.
+    def compile_program(self, nodes):
+        code = CodeObject('<program>')
+        self.compile_unit(code, nodes, True)
+        self.emit(code, HALT)
+        return code
+
+    def compile_method(self, method):
+        code = CodeObject(method.name)
+        if not any(isinstance(node, ENV_NODES) for node in walk(method.body)):
+            code.uses_env = False
+            code.local_names = ['this', 'super']
+            for name in method.parameters:
+                if name not in code.local_names:
+                    code.local_names.append(name)
+                code.parameter_slots.append(code.local_names.index(name))
+            for node in walk(method.body):
+                if isinstance(node, AssignmentNode) and isinstance(node.target, VariableNode) \
+                        and node.target.name not in code.local_names:
+                    code.local_names.append(node.target.name)
+        self.compile_unit(code, method.body, False)
+        self.emit(code, LOAD_CONST, self.constant(code, None))
+        self.emit(code, RETURN)
+        return code
+
+    def compile_unit(self, code, statements, keep_results):
+        self.code = code
+        self.constant_indices = {}
+        self.name_indices = {}
+        self.slots = {name: index for index, name in enumerate(code.local_names)}
+        if keep_results:
+            for stmt in statements:
+                self.compile_statement(stmt, RESULT)
+        else:
+            self.compile_block(statements, None)
+
+    def emit(self, code, op, arg=0):
+        code.code.append((op, arg))
+        return len(code.code) - 1
+
+    def patch(self, position, target):
+        self.code.code[position] = (self.code.code[position][0], target)
+
+    def here(self):
+        return len(self.code.code)
+
+    def constant(self, code, value):
+        # 1, 1.0 and true are distinct constants, and so are 0.0 and -0.0
+        key = (type(value), repr(value) if isinstance(value, float) else value)
+        index = self.constant_indices.get(key)
+        if index is None:
+            index = self.constant_indices[key] = len(code.constants)
+            code.constants.append(value)
+        return index
+
+    def name(self, name):
+        index = self.name_indices.get(name)
+        if index is None:
+            index = self.name_indices[name] = len(self.code.names)
+            self.code.names.append(name)
+        return index
+
+    def cache(self, name):
+        self.code.caches.append(InlineCache(name))
+        return len(self.code.caches) - 1
+
+    def node(self, node):
+        self.code.nodes.append(node)
+        return len(self.code.nodes) - 1
+
+    def op(self, op, arg=0):
+        return self.emit(self.code, op, arg)
+
+    # keep says where a statement's value goes: None drops it, RESULT stores
+    # it as the program's result and PENDING into a register that
+    # COMMIT_RESULT copies to the result once the enclosing top-level if or
+    # while has finished. A runtime error part way through a compound
+    # statement thus leaves the previous statement's value, as in the tree
+    # walker. Only the last statement of a block can decide its value.
+    def compile_block(self, statements, keep):
+        for index, stmt in enumerate(statements):
+            self.compile_statement(stmt, keep if index == len(statements) - 1 else None)
+
+    def finish_statement(self, keep):
+        if keep is None:
+            self.op(POP)
+        else:
+            self.op(STORE_RESULT, keep)
+
+    def compile_statement(self, node, keep):
+        if isinstance(node, (IfNode, WhileNode)):
+            inner = None
+            if keep is not None:
+                inner = PENDING
+                self.op(LOAD_CONST, self.constant(self.code, None))
+                self.op(STORE_RESULT, PENDING)
+            if isinstance(node, IfNode):
+                self.compile_expression(node.condition)
+                skip_then = self.op(POP_JUMP_IF_FALSE)
+                self.compile_block(node.then_body, inner)
+                if node.else_body:
+                    skip_else = self.op(JUMP)
+                    self.patch(skip_then, self.here())
+                    self.compile_block(node.else_body, inner)
+                    self.patch(skip_else, self.here())
+                else:
+                    self.patch(skip_then, self.here())
+            else:
+                loop = self.here()
+                self.compile_expression(node.condition)
+                exit_jump = self.op(POP_JUMP_IF_FALSE)
+                self.compile_block(node.body, inner)
+                self.op(JUMP, loop)
+                self.patch(exit_jump, self.here())
+            if keep == RESULT:
+                self.op(COMMIT_RESULT)
+        elif isinstance(node, ReturnNode):
+            if node.expression:
+                self.compile_expression(node.expression)
+            else:
+                self.op(LOAD_CONST, self.constant(self.code, None))
+            self.op(RETURN)
+        elif isinstance(node, AssignmentNode):
+            self.compile_expression(node.value)
+            if keep is not None:
+                self.op(DUP)
+            target = node.target
+            if isinstance(target, VariableNode):
+                self.compile_store(target.name)
+            elif isinstance(target, PropertyAccessNode):
+                self.compile_expression(target.object)
+                self.op(SET_ATTR, self.name(target.property))
+            else:
+                self.op(RAISE_ERROR, self.constant(self.code, "Invalid assignment target"))
+            if keep is not None:
+                self.op(STORE_RESULT, keep)
+        elif isinstance(node, PrintNode):
+            self.compile_expression(node.expression)
+            self.op(PRINT)
+            self.finish_statement(keep)
+        else:
+            self.compile_expression(node)
+            self.finish_statement(keep)
+
+    def compile_store(self, name):
+        slot = self.slots.get(name)
+        if slot is None:
+            self.op(STORE_NAME, self.name(name))
+        else:
+            self.op(STORE_FAST, slot)
+
+    def compile_expression(self, node):
+        # Over an explicit stack of nodes still to compile and (op, arg)
+        # instructions to emit once the nodes above them are done, so
+        # operator chains of any length compile without recursing
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if type(node) is tuple:
+                self.op(*node)
+            elif isinstance(node, (NumberNode, StringNode, BooleanNode, NullNode)):
+                self.op(LOAD_CONST, self.constant(self.code, node.value))
+            elif isinstance(node, VariableNode):
+                slot = self.slots.get(node.name)
+                if slot is None:
+                    self.op(LOAD_NAME, self.name(node.name))
+                else:
+                    self.op(LOAD_FAST, slot)
+            elif isinstance(node, BinOpNode):
+                opcode = BINARY_OPCODES.get(node.operator)
+                if opcode == ADD and (isinstance(node.left, StringNode) or isinstance(node.right, StringNode)):
+                    # String building goes through binary_op, which can start a Rope
+                    opcode = None
+                if opcode is None:
+                    stack.append((BINARY_OP, self.constant(self.code, node.operator)))
+                else:
+                    stack.append((opcode, 0))
+                stack.append(node.right)
+                stack.append(node.left)
+            elif isinstance(node, UnaryOpNode):
+                opcode = UNARY_OPCODES.get(node.operator)
+                if opcode is None:
+                    stack.append((UNARY_OP, self.constant(self.code, node.operator)))
+                else:
+                    stack.append((opcode, 0))
+                stack.append(node.operand)
+            elif isinstance(node, PropertyAccessNode):
+                stack.append((GET_ATTR, self.cache(node.property)))
+                stack.append(node.object)
+            elif isinstance(node, MethodCallNode):
+                stack.append((CALL, len(node.arguments)))
+                stack.extend(reversed(node.arguments))
+                stack.append((FIND_METHOD, self.cache(node.method_name)))
+                stack.append(node.object)
+            elif isinstance(node, ObjectCreateNode):
+                self.op(NEW, self.name(node.class_name))
+            else:
+                # Class and method definitions, super, and statements nested in
+                # expressions of hand-built trees run on the tree walker
+                self.op(EVAL_NODE, self.node(node))
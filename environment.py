@@ -1,15 +1,53 @@
+# Returned by find() for a name that is not defined anywhere in the chain
+MISSING = object()
+
+# A frame slot that has not been assigned yet
+UNBOUND = object()
+
 class Environment:
+    layout = None
+    
     def __init__(self, parent=None):
         self.store = {}
         self.parent = parent
     
+    def find(self, name):
+        # Walks the chain in a loop and signals a miss with MISSING rather
+        # than an exception
+        env = self
+        while env is not None:
+            layout = env.layout
+            if layout is not None and name in layout:
+                value = env.values[layout[name]]
+                if value is not UNBOUND:
+                    return value
+            store = env.store
+            if name in store:
+                return store[name]
+            env = env.parent
+        return MISSING
+    
     def get(self, name):
-        if name in self.store:
-            return self.store[name]
-        elif self.parent:
-            return self.parent.get(name)
-        else:
+        value = self.find(name)
+        if value is MISSING:
             raise Exception(f"Undefined variable: {name}")
+        return value
     
     def set(self, name, value):
-        self.store[name] = value
\ No newline at end of file
+        self.store[name] = value
+
+class Frame(Environment):
+    # A method call's environment with the variables the resolver laid out
+    # (layout maps name -> slot) held in a list; any other name still goes
+    # to store.
+    def __init__(self, layout, parent=None):
+        super().__init__(parent)
+        self.layout = layout
+        self.values = [UNBOUND] * len(layout)
+    
+    def set(self, name, value):
+        slot = self.layout.get(name)
+        if slot is None:
+            self.store[name] = value
+        else:
+            self.values[slot] = value
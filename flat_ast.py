@@ -0,0 +1,372 @@
+import sys
+import threading
+from array import array
+from nodes import *
+from interpreter import Interpreter, Completion, RuntimeError, RETURN, BREAK, CONTINUE
+
+# How each field of a node is stored in the flat form: NODE fields hold the
+# index of a child node, LIST fields the index of a node list and CONST
+# fields the index of a value in the constant pool. -1 stands for None.
+NODE, LIST, CONST = 0, 1, 2
+
+FIELD_KINDS = {
+    ClassNode: (CONST, LIST, CONST),
+    MethodNode: (CONST, CONST, LIST),
+    MethodCallNode: (NODE, CONST, LIST),
+    ObjectCreateNode: (CONST,),
+    PropertyAccessNode: (NODE, CONST),
+    AssignmentNode: (NODE, NODE),
+    BinOpNode: (NODE, CONST, NODE),
+    UnaryOpNode: (CONST, NODE),
+    IfNode: (NODE, LIST, LIST),
+    WhileNode: (NODE, LIST),
+    ReturnNode: (NODE,),
+    PrintNode: (NODE,),
+    VariableNode: (CONST,),
+    StringNode: (CONST,),
+    NumberNode: (CONST,),
+    BooleanNode: (CONST,),
+    NullNode: (),
+    ExtendsNode: (CONST,),
+    SuperNode: (),
+    LocalNode: (CONST, CONST),
+}
+
+KIND_CODES = {cls: index for index, cls in enumerate(NODE_TYPES)}
+
+
+class FlatRef:
+    # Stands in for a flat node inside a materialised tree
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+
+class FlatAST:
+    # Struct-of-arrays AST: node i has kind NODE_TYPES[kinds[i]] and its
+    # fields in field0[i], field1[i] and field2[i]. Node list j holds
+    # list_items[list_starts[j]:list_ends[j]].
+    def __init__(self):
+        self.kinds = array('B')
+        self.field0 = array('i')
+        self.field1 = array('i')
+        self.field2 = array('i')
+        self.list_starts = array('i')
+        self.list_ends = array('i')
+        self.list_items = array('i')
+        self.consts = []
+        self.const_indices = {}
+        self.roots = -1
+        self._classes = {}
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        flat = cls()
+        flat.roots = flat.add(nodes)
+        return flat
+
+    def add_const(self, value):
+        if value is None:
+            return -1
+        if isinstance(value, list):
+            value = tuple(value)
+        # repr keeps 0.0 and -0.0 apart, which compare and hash equal
+        key = (type(value), repr(value) if isinstance(value, float) else value)
+        index = self.const_indices.get(key)
+        if index is None:
+            index = self.const_indices[key] = len(self.consts)
+            self.consts.append(value)
+        return index
+
+    def add(self, nodes):
+        # Post-order with an explicit stack, so depth is not limited by
+        # the Python stack; returns the list index of nodes.
+        results = []
+        stack = [('list', nodes)]
+        while stack:
+            action, value = stack.pop()
+            if action == 'value':
+                results.append(value)
+            elif value is None:
+                results.append(-1)
+            elif action == 'list':
+                stack.append(('build_list', len(value)))
+                stack.extend(('node', item) for item in reversed(value))
+            elif action == 'node':
+                stack.append(('build_node', value))
+                kinds = FIELD_KINDS[type(value)]
+                for field, kind in reversed(list(zip(value._fields, kinds))):
+                    item = getattr(value, field)
+                    if kind == CONST:
+                        stack.append(('value', self.add_const(item)))
+                    elif kind == LIST:
+                        stack.append(('list', item))
+                    else:
+                        stack.append(('node', item))
+            elif action == 'build_list':
+                start = len(results) - value
+                self.list_starts.append(len(self.list_items))
+                self.list_items.extend(results[start:])
+                self.list_ends.append(len(self.list_items))
+                del results[start:]
+                results.append(len(self.list_starts) - 1)
+            else:
+                count = len(FIELD_KINDS[type(value)])
+                start = len(results) - count
+                fields = results[start:] + [-1] * (3 - count)
+                del results[start:]
+                self.kinds.append(KIND_CODES[type(value)])
+                self.field0.append(fields[0])
+                self.field1.append(fields[1])
+                self.field2.append(fields[2])
+                results.append(len(self.kinds) - 1)
+        return results[0]
+
+    def items(self, list_index):
+        if list_index < 0:
+            return None
+        return self.list_items[self.list_starts[list_index]:self.list_ends[list_index]]
+
+    def field_values(self, index):
+        return (self.field0[index], self.field1[index], self.field2[index])
+
+    def node(self, index):
+        # Rebuilds node index as a nodes.py tree
+        cls = NODE_TYPES[self.kinds[index]]
+        values = []
+        for kind, value in zip(FIELD_KINDS[cls], self.field_values(index)):
+            if value < 0:
+                values.append(None)
+            elif kind == CONST:
+                const = self.consts[value]
+                values.append(list(const) if isinstance(const, tuple) else const)
+            elif kind == LIST:
+                values.append([self.node(item) for item in self.items(value)])
+            else:
+                values.append(self.node(value))
+        return cls(*values)
+
+    def to_nodes(self):
+        return [self.node(index) for index in self.items(self.roots)]
+
+    def class_node(self, index):
+        # A ClassNode whose initialisers and method bodies stay flat, so
+        # objects and method calls built from it still run on the arrays.
+        node = self._classes.get(index)
+        if node is None:
+            name, body, parent_class = self.field_values(index)
+            statements = []
+            for stmt in self.items(body):
+                cls = NODE_TYPES[self.kinds[stmt]]
+                if cls is AssignmentNode and NODE_TYPES[self.kinds[self.field0[stmt]]] is VariableNode:
+                    target = VariableNode(self.consts[self.field0[self.field0[stmt]]])
+                    statements.append(AssignmentNode(target, FlatRef(self.field1[stmt])))
+                elif cls is MethodNode:
+                    statements.append(self.method_node(stmt))
+                else:
+                    statements.append(FlatRef(stmt))
+            parent = self.consts[parent_class] if parent_class >= 0 else None
+            node = self._classes[index] = ClassNode(self.consts[name], statements, parent)
+        return node
+
+    def method_node(self, index):
+        name, parameters, body = self.field_values(index)
+        return MethodNode(self.consts[name], list(self.consts[parameters]),
+                          [FlatRef(stmt) for stmt in self.items(body)])
+
+
+class FlatInterpreter(Interpreter):
+    # Executes a FlatAST by indexing its arrays directly instead of walking
+    # node objects. Class definitions are materialised once, with their
+    # initialisers and method bodies left as FlatRefs into the arrays.
+    def __init__(self, optimise=False, output=None):
+        super().__init__(optimise, resolve=False, quicken=False, output=output)
+        self.flat = None
+        handlers = {
+            ClassNode: self.exec_class,
+            MethodNode: self.exec_method,
+            MethodCallNode: self.exec_method_call,
+            ObjectCreateNode: self.exec_object_create,
+            PropertyAccessNode: self.exec_property_access,
+            AssignmentNode: self.exec_assignment,
+            BinOpNode: self.exec_binop,
+            UnaryOpNode: self.exec_unaryop,
+            IfNode: self.exec_if,
+            WhileNode: self.exec_while,
+            ReturnNode: self.exec_return,
+            PrintNode: self.exec_print,
+            VariableNode: self.exec_variable,
+            StringNode: self.exec_const,
+            NumberNode: self.exec_const,
+            BooleanNode: self.exec_const,
+            NullNode: self.exec_null,
+        }
+        self.handlers = [handlers.get(cls, self.exec_tree) for cls in NODE_TYPES]
+
+    def interpret(self, flat):
+        self.running_thread = threading.get_ident()
+        try:
+            if not isinstance(flat, FlatAST):
+                if self.optimiser:
+                    flat = self.optimiser.optimise(flat)
+                flat = FlatAST.from_nodes(self.resolve(flat))
+            self.flat = flat
+            # One InlineCache per property-access or method-call index
+            self.site_caches = [None] * len(flat.kinds)
+            return self.run([FlatRef(index) for index in flat.items(flat.roots)])
+        finally:
+            self.running_thread = None
+            self.output.flush()
+
+    def visit_FlatRef(self, node):
+        return self.execute(node.index)
+
+    def execute(self, index):
+        return self.handlers[self.flat.kinds[index]](index)
+
+    def execute_block(self, list_index):
+        flat = self.flat
+        items = flat.list_items
+        result = None
+        for position in range(flat.list_starts[list_index], flat.list_ends[list_index]):
+            result = self.execute(items[position])
+            if type(result) is Completion:
+                break
+        return result
+
+    def exec_tree(self, index):
+        return self.visit(self.flat.node(index))
+
+    def exec_class(self, index):
+        return self.visit_ClassNode(self.flat.class_node(index))
+
+    def exec_method(self, index):
+        return self.visit_MethodNode(self.flat.method_node(index))
+
+    def exec_method_call(self, index):
+        flat = self.flat
+        obj = self.execute(flat.field0[index])
+        method = self.cached_method(self.site_caches[index] or self.flat_cache(index), obj)
+        arguments = [self.execute(arg) for arg in flat.items(flat.field2[index])]
+        return method.call(self, arguments, obj)
+
+    def exec_object_create(self, index):
+        return self.create_object(self.flat.consts[self.flat.field0[index]])
+
+    def exec_property_access(self, index):
+        flat = self.flat
+        obj = self.execute(flat.field0[index])
+        return self.cached_property(self.site_caches[index] or self.flat_cache(index), obj)
+
+    def flat_cache(self, index):
+        cache = self.site_caches[index] = self.new_cache(self.flat.consts[self.flat.field1[index]])
+        return cache
+
+    def exec_assignment(self, index):
+        flat = self.flat
+        value = self.execute(flat.field1[index])
+        target = flat.field0[index]
+        target_type = NODE_TYPES[flat.kinds[target]]
+
+        if target_type is VariableNode:
+            self.current_env.set(flat.consts[flat.field0[target]], value)
+        elif target_type is PropertyAccessNode:
+            self.set_property(self.execute(flat.field0[target]), flat.consts[flat.field1[target]], value)
+        else:
+            raise RuntimeError("Invalid assignment target")
+
+        return value
+
+    def exec_binop(self, index):
+        flat = self.flat
+        left = self.execute(flat.field0[index])
+        right = self.execute(flat.field2[index])
+        return self.binary_op(flat.consts[flat.field1[index]], left, right)
+
+    def exec_unaryop(self, index):
+        flat = self.flat
+        return self.unary_op(flat.consts[flat.field0[index]], self.execute(flat.field1[index]))
+
+    def exec_if(self, index):
+        flat = self.flat
+        if self.is_truthy(self.execute(flat.field0[index])):
+            return self.execute_block(flat.field1[index])
+        elif flat.field2[index] >= 0:
+            return self.execute_block(flat.field2[index])
+        return None
+
+    def exec_while(self, index):
+        flat = self.flat
+        condition = flat.field0[index]
+        body = flat.field1[index]
+        result = None
+        while self.is_truthy(self.execute(condition)):
+            value = self.execute_block(body)
+            if type(value) is Completion:
+                if value.kind is BREAK:
+                    break
+                if value.kind is not CONTINUE:
+                    return value
+            else:
+                result = value
+        return result
+
+    def exec_return(self, index):
+        expression = self.flat.field0[index]
+        return Completion(RETURN, self.execute(expression) if expression >= 0 else None)
+
+    def exec_print(self, index):
+        value = self.execute(self.flat.field0[index])
+        self.write(self.stringify(value))
+        return value
+
+    def exec_variable(self, index):
+        return self.lookup(self.flat.consts[self.flat.field0[index]])
+
+    def exec_const(self, index):
+        return self.flat.consts[self.flat.field0[index]]
+
+    def exec_null(self, index):
+        return None
+
+
+def deep_size(root):
+    # Bytes held by root and every object reachable through containers,
+    # node fields and array buffers, counting shared objects once.
+    seen = set()
+    total = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, (list, tuple, set)):
+            stack.extend(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif hasattr(obj, '_fields'):
+            stack.extend(getattr(obj, field) for field in obj._fields)
+    return total
+
+
+def memory_report(nodes):
+    flat = FlatAST.from_nodes(nodes)
+    tree_bytes = deep_size(nodes)
+    flat_bytes = deep_size([flat.kinds, flat.field0, flat.field1, flat.field2,
+                            flat.list_starts, flat.list_ends, flat.list_items, flat.consts])
+    return {
+        'nodes': len(flat.kinds),
+        'tree_bytes': tree_bytes,
+        'flat_bytes': flat_bytes,
+        'ratio': flat_bytes / tree_bytes if tree_bytes else 0.0,
+    }
+
+
+def format_memory_report(report):
+    return (f"AST nodes: {report['nodes']}\n"
+            f"Tree:  {report['tree_bytes']:>12,} bytes\n"
+            f"Flat:  {report['flat_bytes']:>12,} bytes ({report['ratio']:.0%} of tree)")
@@ -0,0 +1,73 @@
+import sys
+import threading
+import time
+
+
+# Reports over Interpreter.memory_stats(), and a sampler that takes them
+# while a program runs.
+
+def summary(stats):
+    return (f"{stats['instances']} instances ({stats['instance_bytes'] / 1024:,.1f} KiB), "
+            f"{stats['environments']} environments ({stats['environment_bytes'] / 1024:,.1f} KiB), "
+            f"{stats['strings']} strings ({stats['string_bytes'] / 1024:,.1f} KiB)")
+
+
+def report(stats):
+    lines = [f"Heap: {summary(stats)}"]
+    if stats['classes']:
+        lines.append(f"  {'class':<24} {'instances':>10} {'KiB':>10}")
+        for name, entry in stats['classes'].items():
+            lines.append(f"  {name:<24} {entry['instances']:>10} {entry['bytes'] / 1024:>10,.1f}")
+    if stats['largest_strings']:
+        lines.append("  largest strings:")
+        for entry in stats['largest_strings']:
+            lines.append(f"  {entry['length']:>10} chars  {entry['preview']!r}")
+    return '\n'.join(lines)
+
+
+class HeapSampler:
+    # Calls interpreter.memory_stats() every interval seconds on a daemon
+    # thread between start() and stop(), or inside a with block. Each
+    # sample is kept in samples as (seconds since start, stats) and passed
+    # to callback; by default a summary line goes to stderr.
+    def __init__(self, interpreter, interval=1.0, callback=None):
+        self.interpreter = interpreter
+        self.interval = interval
+        self.callback = callback if callback is not None else self.print_sample
+        self.samples = []
+        self.started = None
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.sample_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def sample_loop(self):
+        while not self.stopping.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        stats = self.interpreter.memory_stats()
+        elapsed = time.perf_counter() - self.started
+        self.samples.append((elapsed, stats))
+        self.callback(elapsed, stats)
+        return stats
+
+    def print_sample(self, elapsed, stats):
+        print(f"[heap {elapsed:7.2f}s] {summary(stats)}", file=sys.stderr)
@@ -0,0 +1,51 @@
+# Receivers a site remembers besides its monomorphic entry before it is
+# treated as megamorphic and looks every name up.
+POLYMORPHIC_LIMIT = 4
+
+
+class InlineCache:
+    # What name resolved to at one property-access or method-call site.
+    # The last receiver seen is checked first (shape, class_def, target); a
+    # site that sees other receivers keeps up to POLYMORPHIC_LIMIT more in
+    # entries. Method sites key on the receiver's Shape and LinkedClass,
+    # property sites on the Shape alone with class_def left None. A
+    # redefined class is a new LinkedClass and never matches an entry made
+    # for the old one; Interpreter.invalidate_caches also drops them all.
+    __slots__ = ('name', 'shape', 'class_def', 'target', 'entries', 'hits', 'misses')
+
+    def __init__(self, name):
+        self.name = name
+        self.shape = None
+        self.class_def = None
+        self.target = None
+        self.entries = []
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def megamorphic(self):
+        return len(self.entries) >= POLYMORPHIC_LIMIT
+
+    def find(self, shape, class_def):
+        # Everything but the monomorphic entry, which callers check inline
+        for entry in self.entries:
+            if entry[0] is shape and entry[1] is class_def:
+                self.hits += 1
+                return entry[2]
+        self.misses += 1
+        return None
+
+    def add(self, shape, class_def, target):
+        if self.shape is not None:
+            if len(self.entries) >= POLYMORPHIC_LIMIT:
+                return
+            self.entries.append((self.shape, self.class_def, self.target))
+        self.shape = shape
+        self.class_def = class_def
+        self.target = target
+
+    def clear(self):
+        self.shape = None
+        self.class_def = None
+        self.target = None
+        self.entries = []
@@ -1,173 +1,386 @@
+import sys
+import threading
 from nodes import *
-from environment import Environment
+from environment import Environment, Frame, MISSING, UNBOUND
+from optimiser import Optimiser, CONSTANT_NODES
+from resolver import Resolver
+from inline_cache import InlineCache
+from rope import Rope, concat
+from output import BufferedSink
+from profiler import Profiler, MAIN
+from quickening import QUICKENED_NODES, GenericBinOpNode, specialisation
+
+__version__ = "0.1.0"
+
+# Strings memory_stats lists by default, longest first
+LARGEST_STRINGS = 10
+
 
 class ReturnException(Exception):
     def __init__(self, value):
         self.value = value
 
+# How a statement finished when it did not simply fall through to the next
+RETURN, BREAK, CONTINUE = 'return', 'break', 'continue'
+
+class Completion:
+    # What visiting a statement gives back instead of its value when it
+    # ends abruptly. Blocks stop at the first one and hand it up: a method
+    # call unwraps a RETURN, a loop consumes BREAK and CONTINUE, and
+    # anything reaching the top level escapes run as a ReturnException.
+    __slots__ = ('kind', 'value')
+    
+    def __init__(self, kind, value=None):
+        self.kind = kind
+        self.value = value
+
 class RuntimeError(Exception):
     def __init__(self, message):
         self.message = message
         super().__init__(self.message)
 
+# Reported when a program recurses deeper than the backend allows: the VM's
+# frame limit, or Python's recursion limit for the backends that recurse
+DEPTH_ERROR = "Maximum call depth exceeded"
+
+class Shape:
+    # The property layout shared by every object that gained the same
+    # properties in the same order: slots maps a property name to its index
+    # in ObjectInstance.values. Adding a name moves an object along a
+    # transition to the next shape, which is created once and then shared.
+    __slots__ = ('slots', 'transitions')
+    
+    def __init__(self, slots=None):
+        self.slots = slots if slots is not None else {}
+        self.transitions = {}
+    
+    def add(self, name):
+        shape = self.transitions.get(name)
+        if shape is None:
+            slots = dict(self.slots)
+            slots[name] = len(slots)
+            shape = self.transitions[name] = Shape(slots)
+        return shape
+
+EMPTY_SHAPE = Shape()
+
+class LinkedClass:
+    # A class as its objects see it, linked when the definition runs.
+    # vtable holds every method an instance answers to, inherited ones
+    # included and overrides replacing them. The leading initialisers with
+    # constant values, the parent's first, are applied once into
+    # shape/defaults, which new objects copy; initialisers lists the
+    # (name, expression) pairs that still run on every new.
+    __slots__ = ('name', 'node', 'parent', 'vtable', 'fields', 'shape', 'defaults', 'initialisers')
+    
+    def __init__(self, node, parent=None):
+        self.name = node.name
+        self.node = node
+        self.parent = parent
+        self.vtable = dict(parent.vtable) if parent else {}
+        self.fields = list(parent.fields) if parent else []
+        
+        for stmt in node.body:
+            if isinstance(stmt, AssignmentNode) and isinstance(stmt.target, VariableNode):
+                self.fields.append((stmt.target.name, stmt.value))
+            elif isinstance(stmt, MethodNode):
+                # super in an override refers to the parent's version
+                super_class = parent if parent and stmt.name in parent.vtable else None
+                self.vtable[stmt.name] = Method(stmt.name, stmt.parameters, stmt.body, None, super_class, self.name)
+        
+        shape = EMPTY_SHAPE
+        defaults = []
+        count = 0
+        for name, value in self.fields:
+            if not isinstance(value, CONSTANT_NODES):
+                break
+            slot = shape.slots.get(name)
+            if slot is None:
+                shape = shape.add(name)
+                defaults.append(value.value)
+            else:
+                defaults[slot] = value.value
+            count += 1
+        self.shape = shape
+        self.defaults = defaults
+        self.initialisers = self.fields[count:]
+
 class ObjectInstance:
-    def __init__(self, class_name, class_def=None):
-        self.class_name = class_name
-        self.properties = {}
-        self.methods = {}
+    # env is the environment the object was created in; its methods look up
+    # names that are not their own there.
+    __slots__ = ('class_def', 'shape', 'values', 'env')
+    
+    def __init__(self, class_def, env=None):
         self.class_def = class_def
+        self.shape = class_def.shape
+        self.values = list(class_def.defaults)
+        self.env = env
+    
+    @property
+    def class_name(self):
+        return self.class_def.name
+    
+    @property
+    def properties(self):
+        return {name: self.values[slot] for name, slot in self.shape.slots.items()}
+    
+    @property
+    def methods(self):
+        return self.class_def.vtable
     
     def get_property(self, name):
-        if name in self.properties:
-            return self.properties[name]
-        if name in self.methods:
-            return self.methods[name]
-        return None
+        slot = self.shape.slots.get(name)
+        if slot is not None:
+            return self.values[slot]
+        return self.class_def.vtable.get(name)
     
     def set_property(self, name, value):
-        self.properties[name] = value
-    
-    def add_method(self, name, method):
-        self.methods[name] = method
+        slot = self.shape.slots.get(name)
+        if slot is None:
+            self.shape = self.shape.add(name)
+            self.values.append(value)
+        else:
+            self.values[slot] = value
     
     def has_method(self, name):
-        return name in self.methods
+        return name in self.class_def.vtable
+
+class SuperReference(ObjectInstance):
+    # What super is inside an overriding method: the same object, with
+    # methods found in the parent of the class that defined the method.
+    __slots__ = ('instance',)
+    
+    def __init__(self, instance, class_def):
+        self.instance = instance
+        self.class_def = class_def
+    
+    shape = property(lambda self: self.instance.shape,
+                     lambda self, shape: setattr(self.instance, 'shape', shape))
+    values = property(lambda self: self.instance.values)
+    env = property(lambda self: self.instance.env)
 
 class Method:
-    def __init__(self, name, parameters, body, closure_env):
+    # closure_env is None for class methods, which run in their object's env;
+    # owner is the name of the class defining one
+    def __init__(self, name, parameters, body, closure_env, super_class=None, owner=None):
         self.name = name
         self.parameters = parameters
         self.body = body
         self.closure_env = closure_env
+        self.super_class = super_class
+        self.is_override = super_class is not None
+        self.label = f"{owner}.{name}" if owner else name
+    
+    def receiver(self, instance):
+        # (this, super, enclosing environment) for a call on instance
+        if type(instance) is SuperReference:
+            instance = instance.instance
+        env = self.closure_env
+        if env is None and instance is not None:
+            env = instance.env
+        if self.super_class is not None and instance is not None:
+            return instance, SuperReference(instance, self.super_class), env
+        return instance, None, env
 
-    def call(self, interpreter, arguments, instance=None):
+    def bind(self, arguments, instance=None, layout=None):
+        # The environment a call's body runs in; a Frame when the resolver
+        # laid out the body's variables
         if len(arguments) != len(self.parameters):
             raise RuntimeError(f"Method {self.name} expects {len(self.parameters)} arguments, got {len(arguments)}")
         
-        method_env = Environment(self.closure_env)
+        this, super_ref, closure_env = self.receiver(instance)
+        if layout is None:
+            method_env = Environment(closure_env)
+        else:
+            method_env = Frame(layout, closure_env)
         
-        if instance:
-            method_env.set("this", instance)
-            # Add super reference if this is an overriding method
-            if self.is_override and hasattr(instance, 'parent'):
-                method_env.set("super", instance.parent)
+        if this:
+            method_env.set("this", this)
+            if super_ref is not None:
+                method_env.set("super", super_ref)
         
         for i, param in enumerate(self.parameters):
             method_env.set(param, arguments[i])
         
-        previous_env = interpreter.current_env
+        return method_env
+
+    def call(self, interpreter, arguments, instance=None):
+        method_env = self.bind(arguments, instance, interpreter.frame_layout(self.body))
+        
+        interpreter.callers.append(interpreter.current_env)
         interpreter.current_env = method_env
         
         try:
             for stmt in self.body:
-                interpreter.visit(stmt)
+                result = interpreter.visit(stmt)
+                if type(result) is Completion:
+                    return result.value
             return None
-        except ReturnException as ret:
-            return ret.value
         finally:
-            interpreter.current_env = previous_env
+            interpreter.current_env = interpreter.callers.pop()
 
 
 class Interpreter:
-    def __init__(self):
+    def __init__(self, optimise=False, resolve=True, quicken=True, output=None):
         self.global_env = Environment()
         self.current_env = self.global_env
+        # Environments of the calls waiting on the current one, innermost
+        # last; environments only link to their lexical parent
+        self.callers = []
         self.classes = {}
+        # parent name -> names of the classes extending it, in definition order
+        self.subclasses = {}
+        # Constant folding / dead-branch elimination between parse and run;
+        # what it did is left in optimiser.stats.
+        self.optimiser = Optimiser(self) if optimise else None
+        # Method variables become frame slots; names that can never be
+        # defined are reported either way.
+        self.resolver = Resolver()
+        self.resolve_slots = resolve
+        # Every property-access and method-call site's InlineCache
+        self.inline_caches = []
+        self.cache_invalidations = 0
+        # BinOpNodes rewrite themselves into type-specialised forms on first
+        # run. Only for trees the walker owns: backends that tree-walk the
+        # caller's nodes or compile them after running turn it off.
+        self.quicken = quicken
+        self.quickening = {'specialised': 0, 'deopts': 0}
+        # Sink for print statements and error reports (see output.py);
+        # flushed when interpret returns
+        self.output = output if output is not None else BufferedSink()
+        # Set by enable_profiling; None costs nothing, as the profiling
+        # visitors are only in the dispatch table while it is set
+        self.profiler = None
+        # Thread running interpret(), for backends whose memory_roots read
+        # their own Python frames
+        self.running_thread = None
+        # visit() looks the handler up by node type instead of formatting a
+        # method name and calling getattr for every node.
+        self.dispatch = {type(None): self.visit_None}
+        for node_type in NODE_TYPES + QUICKENED_NODES:
+            method = getattr(self, f"visit_{node_type.__name__}", None)
+            if method is not None:
+                self.dispatch[node_type] = method
     
     def interpret(self, nodes):
+        self.running_thread = threading.get_ident()
+        try:
+            if self.optimiser:
+                nodes = self.optimiser.optimise(nodes)
+            nodes = self.resolve(nodes)
+            if self.profiler is None:
+                return self.run(nodes)
+            self.profiler.enter(MAIN)
+            try:
+                return self.run(nodes)
+            finally:
+                self.profiler.exit()
+        finally:
+            self.running_thread = None
+            self.output.flush()
+    
+    def write(self, text):
+        self.output.write_line(text)
+    
+    def resolve(self, nodes):
+        # Names that can never be found stay in self.resolver.errors for
+        # the caller to report; the program's output is left alone.
+        return self.resolver.resolve(nodes, self.global_env.store, self.resolve_slots)
+    
+    def frame_layout(self, body):
+        entry = self.resolver.layouts.get(id(body))
+        return entry[1] if entry is not None else None
+    
+    def run(self, nodes):
         result = None
         try:
             for node in nodes:
-                result = self.visit(node)
+                value = self.visit(node)
+                if type(value) is Completion:
+                    raise ReturnException(value.value)
+                result = value
         except RuntimeError as e:
-            print(f"Runtime Error: {e.message}")
+            self.write(f"Runtime Error: {e.message}")
+        except RecursionError:
+            self.write(f"Runtime Error: {DEPTH_ERROR}")
         return result
     
     def visit(self, node):
-        if node is None:
-            return None
-        
-        method_name = f"visit_{type(node).__name__}"
-        method = getattr(self, method_name, None)
+        method = self.dispatch.get(type(node))
         if method is None:
-            raise RuntimeError(f"No visit method for {type(node).__name__}")
+            method = self.resolve_visitor(type(node))
         return method(node)
+    
+    def resolve_visitor(self, node_type):
+        method = getattr(self, f"visit_{node_type.__name__}", None)
+        if method is None:
+            raise RuntimeError(f"No visit method for {node_type.__name__}")
+        self.dispatch[node_type] = method
+        return method
+    
+    def visit_None(self, node):
+        return None
         
     def visit_ClassNode(self, node):
-        # Store class with its parent reference
-        self.classes[node.name] = node
+        self.link_class(node)
         
         class_env = Environment(self.current_env)
-        previous_env = self.current_env
+        self.callers.append(self.current_env)
         self.current_env = class_env
         
         try:
-            # If there's a parent class, inherit its properties/methods
-            if node.parent_class:
-                if node.parent_class not in self.classes:
-                    raise RuntimeError(f"Parent class not found: {node.parent_class}")
-                
-                parent_class = self.classes[node.parent_class]
-                # Create a temporary instance to copy properties
-                temp_parent = ObjectInstance(node.parent_class, parent_class)
-                self.visit_ClassNode(parent_class)  # Ensure parent is processed
-                
-                # Copy parent properties to current class
-                for prop, value in temp_parent.properties.items():
-                    class_env.set(prop, value)
-                for method_name, method in temp_parent.methods.items():
-                    class_env.set(method_name, method)
-            
-            # Process current class body
+            # Process current class body; a return in it ends the
+            # enclosing method
             for stmt in node.body:
-                self.visit(stmt)
+                result = self.visit(stmt)
+                if type(result) is Completion:
+                    return result
         finally:
-            self.current_env = previous_env
+            self.current_env = self.callers.pop()
         
         return node
     
-    def visit_ObjectCreateNode(self, node):
-        if node.class_name not in self.classes:
-            raise RuntimeError(f"Undefined class: {node.class_name}")
+    def link_class(self, node, relinked=None):
+        parent = None
+        if node.parent_class:
+            parent = self.classes.get(node.parent_class)
+            if parent is None:
+                raise RuntimeError(f"Parent class not found: {node.parent_class}")
+            self.subclasses.setdefault(node.parent_class, {})[node.name] = None
+        if node.name in self.classes and relinked is None:
+            self.invalidate_caches()
+        self.classes[node.name] = LinkedClass(node, parent)
         
-        class_def = self.classes[node.class_name]
-        obj = ObjectInstance(node.class_name, class_def)
+        # Subclasses linked against an earlier definition pick this one up
+        relinked = relinked if relinked is not None else {node.name}
+        for name in list(self.subclasses.get(node.name, ())):
+            child = self.classes.get(name)
+            if child is not None and child.node.parent_class == node.name and name not in relinked:
+                relinked.add(name)
+                self.link_class(child.node, relinked)
+    
+    def visit_ObjectCreateNode(self, node):
+        return self.create_object(node.class_name)
+    
+    def create_object(self, class_name):
+        class_def = self.classes.get(class_name)
+        if class_def is None:
+            raise RuntimeError(f"Undefined class: {class_name}")
         
-        # Set up parent reference if exists
-        if class_def.parent_class:
-            if class_def.parent_class not in self.classes:
-                raise RuntimeError(f"Parent class not found: {class_def.parent_class}")
-            parent_class_def = self.classes[class_def.parent_class]
-            obj.parent = ObjectInstance(class_def.parent_class, parent_class_def)
+        obj = ObjectInstance(class_def, self.current_env)
+        if not class_def.initialisers:
+            return obj
         
         obj_env = Environment(self.current_env)
         obj_env.set("this", obj)
-        previous_env = self.current_env
+        self.callers.append(self.current_env)
         self.current_env = obj_env
         
         try:
-            # Process inheritance chain
-            current_class = class_def
-            while current_class:
-                for stmt in current_class.body:
-                    if isinstance(stmt, AssignmentNode) and isinstance(stmt.target, VariableNode):
-                        value = self.visit(stmt.value)
-                        obj.set_property(stmt.target.name, value)
-                    elif isinstance(stmt, MethodNode):
-                        # Check if this method overrides a parent method
-                        is_override = (hasattr(obj, 'parent') and 
-                                    obj.parent.has_method(stmt.name))
-                        method = Method(stmt.name, stmt.parameters, stmt.body, 
-                                    self.current_env, is_override)
-                        obj.add_method(stmt.name, method)
-                
-                # Move to parent class
-                if hasattr(current_class, 'parent_class') and current_class.parent_class:
-                    current_class = self.classes[current_class.parent_class]
-                else:
-                    current_class = None
+            for name, value in class_def.initialisers:
+                obj.set_property(name, self.visit(value))
         finally:
-            self.current_env = previous_env
+            self.current_env = self.callers.pop()
         
         return obj
     
@@ -177,38 +390,253 @@ class Interpreter:
     
     def visit_MethodCallNode(self, node):
         obj = self.visit(node.object)
+        method = self.cached_method(node.cache or self.site_cache(node, node.method_name), obj)
+        arguments = [self.visit(arg) for arg in node.arguments]
+        
+        # Method.call, inlined to save a Python frame on every call
+        method_env = method.bind(arguments, obj, self.frame_layout(method.body))
+        self.callers.append(self.current_env)
+        self.current_env = method_env
+        try:
+            for stmt in method.body:
+                result = self.visit(stmt)
+                if type(result) is Completion:
+                    return result.value
+            return None
+        finally:
+            self.current_env = self.callers.pop()
+    
+    def enable_profiling(self, profiler=None):
+        # Method calls and while loops the tree walker runs from now on are
+        # recorded in the returned Profiler
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.dispatch[MethodCallNode] = self.profile_MethodCallNode
+        self.dispatch[WhileNode] = self.profile_WhileNode
+        return self.profiler
+    
+    def profile_MethodCallNode(self, node):
+        obj = self.visit(node.object)
+        method = self.cached_method(node.cache or self.site_cache(node, node.method_name), obj)
+        arguments = [self.visit(arg) for arg in node.arguments]
+        profiler = self.profiler
+        profiler.enter(method.label)
+        try:
+            return method.call(self, arguments, obj)
+        finally:
+            profiler.exit()
+    
+    def profile_WhileNode(self, node):
+        # visit_WhileNode, counting every statement of the body that starts
+        hits = self.profiler.loop_hits(node)
+        result = None
+        while self.is_truthy(self.visit(node.condition)):
+            for index, stmt in enumerate(node.body):
+                hits[index] += 1
+                value = self.visit(stmt)
+                if type(value) is Completion:
+                    break
+                result = value
+            else:
+                continue
+            if value.kind is BREAK:
+                break
+            if value.kind is not CONTINUE:
+                return value
+        return result
+    
+    def find_method(self, obj, name):
         if not isinstance(obj, ObjectInstance):
             raise RuntimeError("Cannot call method on non-object")
         
-        if not obj.has_method(node.method_name):
-            raise RuntimeError(f"Method '{node.method_name}' not found on object of type {obj.class_name}")
+        method = obj.class_def.vtable.get(name)
+        if method is None:
+            raise RuntimeError(f"Method '{name}' not found on object of type {obj.class_name}")
         
-        method = obj.get_property(node.method_name)
-        arguments = [self.visit(arg) for arg in node.arguments]
+        # A property of the same name shadows the method
+        slot = obj.shape.slots.get(name)
+        return method if slot is None else obj.values[slot]
+    
+    def site_cache(self, node, name):
+        node.cache = self.new_cache(name)
+        return node.cache
+    
+    def new_cache(self, name):
+        cache = InlineCache(name)
+        self.inline_caches.append(cache)
+        return cache
+    
+    def invalidate_caches(self):
+        for cache in self.inline_caches:
+            cache.clear()
+        self.cache_invalidations += 1
+    
+    def memory_roots(self):
+        # Where a program's live values are held: the globals, the current
+        # environment, the callers' environments and the classes. Backends
+        # that keep values elsewhere add their own; operands the tree walker
+        # is half-way through evaluating are not counted.
+        return [self.global_env, self.current_env] + list(self.callers) + list(self.classes.values())
+    
+    def memory_stats(self, largest=LARGEST_STRINGS):
+        # What the program can still reach from memory_roots: instances and
+        # their bytes per class, environments (method frames, object scopes
+        # and the closures methods keep), and strings. Bytes are
+        # sys.getsizeof of each object and the containers it owns, so they
+        # are approximate; every object is counted once however often it is
+        # referenced. Containers are copied before they are read, so a
+        # HeapSampler thread can call this while the program runs.
+        getsizeof = sys.getsizeof
+        classes = {}
+        environments = 0
+        environment_bytes = 0
+        strings = {}
+        seen = set()
+        stack = self.memory_roots()
+        while stack:
+            value = stack.pop()
+            kind = type(value)
+            if kind is str or kind is Rope:
+                strings[id(value)] = value
+                continue
+            if value is None or kind is int or kind is float or kind is bool or id(value) in seen:
+                continue
+            seen.add(id(value))
+            if isinstance(value, Environment):
+                environments += 1
+                environment_bytes += getsizeof(value) + getsizeof(value.store)
+                stack.extend(list(value.store.values()))
+                if value.layout is not None:
+                    environment_bytes += getsizeof(value.values)
+                    stack.extend(list(value.values))
+                stack.append(value.parent)
+            elif kind is ObjectInstance:
+                entry = classes.get(value.class_def.name)
+                if entry is None:
+                    entry = classes[value.class_def.name] = {'instances': 0, 'bytes': 0}
+                entry['instances'] += 1
+                entry['bytes'] += getsizeof(value) + getsizeof(value.values)
+                stack.extend(list(value.values))
+                stack.append(value.env)
+                stack.append(value.class_def)
+            elif kind is SuperReference:
+                stack.append(value.instance)
+            elif kind is Method:
+                stack.append(value.closure_env)
+            elif kind is LinkedClass:
+                stack.extend(list(value.vtable.values()))
+                stack.append(value.parent)
+            elif kind is list or kind is tuple:
+                # Arguments, frame slots and value stacks of running calls
+                stack.extend(list(value))
+            elif kind is Completion:
+                stack.append(value.value)
         
-        return method.call(self, arguments, obj)
+        sizes = []
+        for value in strings.values():
+            if type(value) is Rope:
+                parts = value.parts[:value.count]
+                pieces = {id(part): part for part in parts}
+                size = getsizeof(value) + getsizeof(parts) + sum(getsizeof(part) for part in pieces.values())
+                sizes.append((len(value), size, value.head(60)))
+            else:
+                sizes.append((len(value), getsizeof(value), value[:60]))
+        sizes.sort(key=lambda entry: entry[0], reverse=True)
+        ranked = sorted(classes.items(), key=lambda item: item[1]['bytes'], reverse=True)
+        return {
+            'classes': dict(ranked),
+            'instances': sum(entry['instances'] for entry in classes.values()),
+            'instance_bytes': sum(entry['bytes'] for entry in classes.values()),
+            'environments': environments,
+            'environment_bytes': environment_bytes,
+            'strings': len(sizes),
+            'string_bytes': sum(size for _, size, _ in sizes),
+            'largest_strings': [{'length': length, 'bytes': size, 'preview': preview}
+                                for length, size, preview in sizes[:largest]],
+        }
+    
+    def cache_stats(self):
+        hits = sum(cache.hits for cache in self.inline_caches)
+        misses = sum(cache.misses for cache in self.inline_caches)
+        return {
+            'sites': len(self.inline_caches),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'polymorphic': sum(1 for cache in self.inline_caches if cache.entries),
+            'megamorphic': sum(1 for cache in self.inline_caches if cache.megamorphic),
+            'invalidations': self.cache_invalidations,
+        }
+    
+    def cached_method(self, cache, obj):
+        # find_method through a site's cache. A method shadowed by a
+        # property is not cached, since the target is then per object.
+        try:
+            shape = obj.shape
+            class_def = obj.class_def
+        except AttributeError:
+            return self.find_method(obj, cache.name)
+        if shape is cache.shape and class_def is cache.class_def:
+            cache.hits += 1
+            return cache.target
+        method = cache.find(shape, class_def)
+        if method is None:
+            method = self.find_method(obj, cache.name)
+            if cache.name not in shape.slots:
+                cache.add(shape, class_def, method)
+        return method
+    
+    def cached_property(self, cache, obj):
+        # get_property through a site's cache. The shape alone fixes a
+        # property's slot, so the class is not part of the key; a method
+        # read as a value is looked up each time. A property holding null
+        # goes to get_property too, which reports it as not found.
+        try:
+            shape = obj.shape
+        except AttributeError:
+            return self.get_property(obj, cache.name)
+        if shape is cache.shape:
+            cache.hits += 1
+            value = obj.values[cache.target]
+        else:
+            slot = cache.find(shape, None)
+            if slot is None:
+                slot = shape.slots.get(cache.name)
+                if slot is None:
+                    return self.get_property(obj, cache.name)
+                cache.add(shape, None, slot)
+            value = obj.values[slot]
+        if value is None:
+            return self.get_property(obj, cache.name)
+        return value
     
     def visit_PropertyAccessNode(self, node):
-        obj = self.visit(node.object)
+        return self.cached_property(node.cache or self.site_cache(node, node.property), self.visit(node.object))
+    
+    def get_property(self, obj, name):
         if isinstance(obj, ObjectInstance):
-            value = obj.get_property(node.property)
+            slot = obj.shape.slots.get(name)
+            value = obj.values[slot] if slot is not None else obj.class_def.vtable.get(name)
             if value is None:
-                raise RuntimeError(f"Property '{node.property}' not found on object of type {obj.class_name}")
+                raise RuntimeError(f"Property '{name}' not found on object of type {obj.class_name}")
             return value
         else:
             raise RuntimeError("Cannot access property on non-object")
     
+    def set_property(self, obj, name, value):
+        if isinstance(obj, ObjectInstance):
+            obj.set_property(name, value)
+        else:
+            raise RuntimeError("Cannot set property on non-object")
+    
     def visit_AssignmentNode(self, node):
         value = self.visit(node.value)
         
-        if isinstance(node.target, VariableNode):
+        if isinstance(node.target, LocalNode):
+            self.current_env.values[node.target.slot] = value
+        elif isinstance(node.target, VariableNode):
             self.current_env.set(node.target.name, value)
         elif isinstance(node.target, PropertyAccessNode):
-            obj = self.visit(node.target.object)
-            if isinstance(obj, ObjectInstance):
-                obj.set_property(node.target.property, value)
-            else:
-                raise RuntimeError("Cannot set property on non-object")
+            self.set_property(self.visit(node.target.object), node.target.property, value)
         else:
             raise RuntimeError("Invalid assignment target")
         
@@ -217,9 +645,132 @@ class Interpreter:
     def visit_BinOpNode(self, node):
         left = self.visit(node.left)
         right = self.visit(node.right)
-        
-        op = node.operator
+        if self.quicken:
+            quickened = specialisation(node.operator, left, right)
+            node.__class__ = quickened
+            if quickened is not GenericBinOpNode:
+                self.quickening['specialised'] += 1
+        return self.binary_op(node.operator, left, right)
+    
+    def visit_GenericBinOpNode(self, node):
+        return self.binary_op(node.operator, self.visit(node.left), self.visit(node.right))
+    
+    def deoptimise(self, node, left, right):
+        # A quickened node's guard failed; it stays generic from now on
+        node.__class__ = GenericBinOpNode
+        self.quickening['deopts'] += 1
+        return self.binary_op(node.operator, left, right)
+    
+    def visit_IntAddNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is int and type(right) is int:
+            return left + right
+        return self.deoptimise(node, left, right)
+    
+    def visit_IntSubtractNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is int and type(right) is int:
+            return left - right
+        return self.deoptimise(node, left, right)
+    
+    def visit_IntMultiplyNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is int and type(right) is int:
+            return left * right
+        return self.deoptimise(node, left, right)
+    
+    def visit_IntLessNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is int and type(right) is int:
+            return left < right
+        return self.deoptimise(node, left, right)
+    
+    def visit_IntLessEqualNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is int and type(right) is int:
+            return left <= right
+        return self.deoptimise(node, left, right)
+    
+    def visit_IntGreaterNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is int and type(right) is int:
+            return left > right
+        return self.deoptimise(node, left, right)
+    
+    def visit_IntGreaterEqualNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is int and type(right) is int:
+            return left >= right
+        return self.deoptimise(node, left, right)
+    
+    def visit_IntEqualNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is int and type(right) is int:
+            return left == right
+        return self.deoptimise(node, left, right)
+    
+    def visit_IntNotEqualNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is int and type(right) is int:
+            return left != right
+        return self.deoptimise(node, left, right)
+    
+    def visit_FloatAddNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is float and type(right) is float:
+            return left + right
+        return self.deoptimise(node, left, right)
+    
+    def visit_FloatSubtractNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is float and type(right) is float:
+            return left - right
+        return self.deoptimise(node, left, right)
+    
+    def visit_FloatMultiplyNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is float and type(right) is float:
+            return left * right
+        return self.deoptimise(node, left, right)
+    
+    def visit_FloatLessNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is float and type(right) is float:
+            return left < right
+        return self.deoptimise(node, left, right)
+    
+    def visit_StrAddNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is str and type(right) is str:
+            return concat(left, right)
+        return self.deoptimise(node, left, right)
+    
+    def visit_StrEqualNode(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(left) is str and type(right) is str:
+            return left == right
+        return self.deoptimise(node, left, right)
+    
+    
+    def binary_op(self, op, left, right):
         if op == '+':
+            if type(left) is str and type(right) is str:
+                return concat(left, right)
             return left + right
         elif op == '-':
             return left - right
@@ -249,54 +800,76 @@ class Interpreter:
             raise RuntimeError(f"Unknown binary operator: {op}")
     
     def visit_UnaryOpNode(self, node):
-        operand = self.visit(node.operand)
-        
-        if node.operator == '-':
+        return self.unary_op(node.operator, self.visit(node.operand))
+    
+    def unary_op(self, op, operand):
+        if op == '-':
             return -operand
-        elif node.operator == 'not' or node.operator == '!':
+        elif op == 'not' or op == '!':
             return not self.is_truthy(operand)
         else:
-            raise RuntimeError(f"Unknown unary operator: {node.operator}")
+            raise RuntimeError(f"Unknown unary operator: {op}")
     
     def visit_IfNode(self, node):
         condition = self.visit(node.condition)
         
         if self.is_truthy(condition):
-            result = None
-            for stmt in node.then_body:
-                result = self.visit(stmt)
-            return result
+            body = node.then_body
         elif node.else_body:
-            result = None
-            for stmt in node.else_body:
-                result = self.visit(stmt)
-            return result
+            body = node.else_body
+        else:
+            return None
         
-        return None
+        # The last statement's value, or the Completion that cut it short
+        result = None
+        for stmt in body:
+            result = self.visit(stmt)
+            if type(result) is Completion:
+                break
+        return result
     
     def visit_WhileNode(self, node):
         result = None
         while self.is_truthy(self.visit(node.condition)):
             for stmt in node.body:
-                result = self.visit(stmt)
+                value = self.visit(stmt)
+                if type(value) is Completion:
+                    break
+                result = value
+            else:
+                continue
+            # The body was cut short
+            if value.kind is BREAK:
+                break
+            if value.kind is not CONTINUE:
+                return value
         return result
     
     def visit_ReturnNode(self, node):
         value = None
         if node.expression:
             value = self.visit(node.expression)
-        raise ReturnException(value)
+        return Completion(RETURN, value)
     
     def visit_PrintNode(self, node):
         value = self.visit(node.expression)
-        print(self.stringify(value))
+        self.write(self.stringify(value))
         return value
     
     def visit_VariableNode(self, node):
-        try:
-            return self.current_env.get(node.name)
-        except Exception:
-            raise RuntimeError(f"Undefined variable: {node.name}")
+        return self.lookup(node.name)
+    
+    def visit_LocalNode(self, node):
+        value = self.current_env.values[node.slot]
+        if value is UNBOUND:
+            return self.lookup(node.name)
+        return value
+    
+    def lookup(self, name):
+        value = self.current_env.find(name)
+        if value is MISSING:
+            raise RuntimeError(f"Undefined variable: {name}")
+        return value
     
     def visit_StringNode(self, node):
         return node.value
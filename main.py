@@ -1,11 +1,67 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
 from tkinter.font import Font
-import io
+import argparse
 import sys
-from Lexer import Lexer
+from pathlib import Path
+from Lexer import Lexer, IncrementalLexer
+from Tokeniser import *
 from parser import Parser
 from interpreter import Interpreter
+from flat_ast import FlatInterpreter
+from vm import VirtualMachine, MAX_CALL_DEPTH
+from closures import ClosureInterpreter
+from transpiler import TranspiledInterpreter
+from ast_cache import ASTCache
+from output import CollectingSink
+from heap import HeapSampler, report as heap_report
+
+# Parsed programs from the editor; scripts run from the command line are
+# cached in an __oopcache__ directory next to them, like __pycache__.
+EDITOR_CACHE_DIR = Path.home() / '.cache' / 'oop-language'
+
+# Run the constant-folding / dead-branch optimiser before interpreting
+OPTIMISE = True
+
+# Execution backends; all of them print the same output for a program
+BACKENDS = {
+    'tree': Interpreter,
+    'flat': FlatInterpreter,
+    'vm': VirtualMachine,
+    'closure': ClosureInterpreter,
+    'python': TranspiledInterpreter,
+}
+BACKEND = 'tree'
+
+# Print the inline caches' hit/miss counts after running a script
+CACHE_STATS = False
+
+# Print how many BinOpNodes the tree backend specialised and deoptimised
+QUICKEN_STATS = False
+
+# Profile the run (tree backend): print the per-method and while-loop
+# report, and write collapsed call stacks for flame graphs to PROFILE_STACKS
+PROFILE = False
+PROFILE_STACKS = None
+
+# Print live instances per class, environments and the largest strings
+# after the run, and a heap summary every MEMORY_SAMPLE seconds during it
+MEMORY_STATS = False
+MEMORY_SAMPLE = None
+
+# Print the Python source the 'python' backend generates instead of running
+DUMP_PYTHON = False
+
+# Deepest method recursion the vm backend allows; it keeps its call stack on
+# the heap, so this can go far beyond Python's recursion limit
+MAX_DEPTH = MAX_CALL_DEPTH
+
+HIGHLIGHT_TAGS = {
+    CLASS: 'keyword', EXTENDS: 'keyword', NEW: 'keyword', PRINT: 'keyword', IF: 'keyword',
+    WHILE: 'keyword', RETURN: 'keyword', FUNCTION: 'keyword', TRUE: 'keyword',
+    FALSE: 'keyword', NULL: 'keyword', AND: 'keyword', OR: 'keyword',
+    STRING: 'string', NUMBER: 'number'
+}
 
 class OOPLanguageGUI:
     def __init__(self, root):
@@ -22,6 +78,14 @@ class OOPLanguageGUI:
         self.style.configure('Green.TButton', foreground='white', background='#5cb85c')
         self.style.configure('Blue.TButton', foreground='white', background='#5bc0de')
         
+        self.ast_cache = ASTCache(EDITOR_CACHE_DIR)
+        
+        # Parser of the last run; later runs only reparse the edited blocks
+        self.parser = None
+        
+        # Token stream of the editor buffer, kept up to date per keystroke
+        self.lexer_service = IncrementalLexer()
+        
         # Create widgets
         self.create_widgets()
         self.create_menu()
@@ -129,24 +193,20 @@ class OOPLanguageGUI:
         self.highlight_syntax()
     
     def highlight_syntax(self):
-        # Basic syntax highlighting (expand this for full language support)
-        text = self.code_input.get('1.0', tk.END)
+        # Re-lex only around the edit and retag the tokens that changed
+        text = self.code_input.get('1.0', 'end-1c')
+        lexer = self.lexer_service
+        first, last = lexer.update(text)
+        start = lexer.end_of(first - 1) if first else 0
+        end = lexer.start_of(last) if last < len(lexer) else len(text)
         
-        # Remove all tags
-        for tag in self.code_input.tag_names():
-            self.code_input.tag_remove(tag, '1.0', tk.END)
+        for tag in ('keyword', 'string', 'number'):
+            self.code_input.tag_remove(tag, f"1.0+{start}c", f"1.0+{end}c")
         
-        # Apply keyword highlighting
-        keywords = ['class', 'new', 'print']
-        for word in keywords:
-            start = '1.0'
-            while True:
-                start = self.code_input.search(word, start, stopindex=tk.END)
-                if not start:
-                    break
-                end = f"{start}+{len(word)}c"
-                self.code_input.tag_add('keyword', start, end)
-                start = end
+        for token in lexer.slice(first, last):
+            tag = HIGHLIGHT_TAGS.get(token.type)
+            if tag:
+                self.code_input.tag_add(tag, f"1.0+{token.start}c", f"1.0+{token.end}c")
     
     def load_example(self):
         example_code = '''class Person {
@@ -186,15 +246,27 @@ print car1.model;'''
         self.status_bar.config(text="Running...")
         self.root.update()
         
-        old_stdout = sys.stdout
-        sys.stdout = captured_output = io.StringIO()
+        # The program prints into its own sink instead of sys.stdout
+        captured_output = CollectingSink()
         
         try:
-            lexer = Lexer(code)
-            parser = Parser(lexer)
-            ast = parser.parse()
+            # A program run before comes from the cache; anything else is
+            # reparsed around the edits since the last parse. Cached programs
+            # parsed without errors, and self.parser diffs against its own
+            # text, so skipping it on a hit leaves it in step.
+            key, ast = self.ast_cache.lookup(code)
+            if ast is None:
+                if self.parser is None:
+                    self.parser = Parser(Lexer(code))
+                    ast = self.parser.parse()
+                else:
+                    ast = self.parser.reparse(code)
+                for error in self.parser.errors:
+                    captured_output.write_line(f"Parse error: {error}")
+                if not self.parser.errors:
+                    self.ast_cache.store(key, ast)
             
-            interpreter = Interpreter()
+            interpreter = make_interpreter(captured_output)
             interpreter.interpret(ast)
             
             output = captured_output.getvalue()
@@ -203,14 +275,18 @@ print car1.model;'''
             else:
                 self.output_text.insert(tk.END, "Code executed successfully (no output)")
             
-            self.status_bar.config(text="Execution completed")
+            errors = interpreter.resolver.errors
+            if errors:
+                self.status_bar.config(text=f"Execution completed; Resolve error: {errors[0]}")
+            else:
+                self.status_bar.config(text="Execution completed")
                 
         except Exception as e:
+            self.parser = None
             self.output_text.insert(tk.END, f"Error: {str(e)}")
             self.status_bar.config(text=f"Error: {str(e)}")
         
         finally:
-            sys.stdout = old_stdout
             self.output_text.config(state=tk.DISABLED)
     
     def clear_code(self):
@@ -253,7 +329,87 @@ print car1.model;'''
     def paste_text(self):
         self.code_input.event_generate("<<Paste>>")
 
+def make_interpreter(output=None):
+    if BACKEND == 'vm':
+        return VirtualMachine(optimise=OPTIMISE, max_depth=MAX_DEPTH, output=output)
+    return BACKENDS[BACKEND](optimise=OPTIMISE, output=output)
+
+def run_file(path):
+    # Streams the script through the lexer instead of reading it whole, and
+    # caches the parsed program in __oopcache__ next to it
+    path = Path(path)
+    cache = ASTCache(path.parent / '__oopcache__')
+    nodes = cache.parse(path)
+    if DUMP_PYTHON:
+        for error in cache.errors:
+            print(f"Parse error: {error}", file=sys.stderr)
+        print(TranspiledInterpreter(optimise=OPTIMISE).translate(nodes), end='')
+        return
+    interpreter = make_interpreter()
+    for error in cache.errors:
+        interpreter.write(f"Parse error: {error}")
+    if PROFILE or PROFILE_STACKS:
+        profiler = interpreter.enable_profiling()
+    if MEMORY_SAMPLE:
+        with HeapSampler(interpreter, MEMORY_SAMPLE):
+            interpreter.interpret(nodes)
+    else:
+        interpreter.interpret(nodes)
+    for error in interpreter.resolver.errors:
+        print(f"Resolve error: {error}", file=sys.stderr)
+    if MEMORY_STATS:
+        print(heap_report(interpreter.memory_stats()), file=sys.stderr)
+    if PROFILE:
+        print(profiler.report(), file=sys.stderr)
+    if PROFILE_STACKS:
+        Path(PROFILE_STACKS).write_text(profiler.collapsed())
+    if CACHE_STATS:
+        stats = interpreter.cache_stats()
+        print(f"Inline caches: {stats['sites']} sites, {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.1%}), {stats['polymorphic']} polymorphic, "
+              f"{stats['megamorphic']} megamorphic, {stats['invalidations']} invalidations", file=sys.stderr)
+    if QUICKEN_STATS:
+        stats = interpreter.quickening
+        print(f"Quickening: {stats['specialised']} specialised, {stats['deopts']} deopts", file=sys.stderr)
+
 def main():
+    global BACKEND, OPTIMISE, CACHE_STATS, QUICKEN_STATS, PROFILE, PROFILE_STACKS, MEMORY_STATS, MEMORY_SAMPLE, DUMP_PYTHON, MAX_DEPTH
+    arg_parser = argparse.ArgumentParser(description="OOP language interpreter and IDE")
+    arg_parser.add_argument('file', nargs='?', help="script to run; opens the IDE when omitted")
+    arg_parser.add_argument('--backend', choices=sorted(BACKENDS), default=BACKEND)
+    arg_parser.add_argument('--no-optimise', dest='optimise', action='store_false', default=OPTIMISE)
+    arg_parser.add_argument('--cache-stats', action='store_true', default=CACHE_STATS)
+    arg_parser.add_argument('--quicken-stats', action='store_true', default=QUICKEN_STATS)
+    arg_parser.add_argument('--profile', action='store_true', default=PROFILE,
+                            help="report time per method and while-loop statement hits (tree backend)")
+    arg_parser.add_argument('--profile-stacks', metavar='PATH', default=PROFILE_STACKS,
+                            help="write collapsed call stacks for flame-graph tools (tree backend)")
+    arg_parser.add_argument('--memory-stats', action='store_true', default=MEMORY_STATS,
+                            help="report what the program still references when it ends")
+    arg_parser.add_argument('--memory-sample', type=float, metavar='SECONDS', default=MEMORY_SAMPLE,
+                            help="print a heap summary at this interval while running")
+    arg_parser.add_argument('--dump-python', action='store_true', default=DUMP_PYTHON,
+                            help="print the script translated to Python and exit")
+    arg_parser.add_argument('--max-depth', type=int, default=MAX_DEPTH,
+                            help="deepest method recursion for the vm backend, which runs on a heap stack")
+    args = arg_parser.parse_args()
+    if (args.profile or args.profile_stacks) and args.backend != 'tree':
+        arg_parser.error("profiling needs the tree backend")
+    BACKEND = args.backend
+    OPTIMISE = args.optimise
+    CACHE_STATS = args.cache_stats
+    QUICKEN_STATS = args.quicken_stats
+    PROFILE = args.profile
+    PROFILE_STACKS = args.profile_stacks
+    MEMORY_STATS = args.memory_stats
+    MEMORY_SAMPLE = args.memory_sample
+    DUMP_PYTHON = args.dump_python
+    MAX_DEPTH = args.max_depth
+    
+    if args.file:
+        run_file(args.file)
+        return
+    
     root = tk.Tk()
     app = OOPLanguageGUI(root)
     root.mainloop()
@@ -1,89 +1,178 @@
 class ClassNode:
+    __slots__ = ('name', 'body', 'parent_class')
+    _fields = ('name', 'body', 'parent_class')
+    
     def __init__(self, name, body, parent_class=None):
         self.name = name
         self.body = body
         self.parent_class = parent_class
 
 class MethodNode:
+    __slots__ = ('name', 'parameters', 'body')
+    _fields = ('name', 'parameters', 'body')
+    
     def __init__(self, name, parameters, body):
         self.name = name
         self.parameters = parameters
         self.body = body
 
 class MethodCallNode:
+    # cache is the site's InlineCache, filled in by the interpreter
+    __slots__ = ('object', 'method_name', 'arguments', 'cache')
+    _fields = ('object', 'method_name', 'arguments')
+    
     def __init__(self, object_expr, method_name, arguments):
         self.object = object_expr
         self.method_name = method_name
         self.arguments = arguments
+        self.cache = None
 
 class ObjectCreateNode:
+    __slots__ = ('class_name',)
+    _fields = ('class_name',)
+    
     def __init__(self, class_name):
         self.class_name = class_name
 
 class PropertyAccessNode:
+    __slots__ = ('object', 'property', 'cache')
+    _fields = ('object', 'property')
+    
     def __init__(self, object_expr, property_name):
         self.object = object_expr
         self.property = property_name
+        self.cache = None
 
 class AssignmentNode:
+    __slots__ = ('target', 'value')
+    _fields = ('target', 'value')
+    
     def __init__(self, target, value):
         self.target = target
         self.value = value
 
 class BinOpNode:
+    __slots__ = ('left', 'operator', 'right')
+    _fields = ('left', 'operator', 'right')
+    
     def __init__(self, left, operator, right):
         self.left = left
         self.operator = operator
         self.right = right
 
 class UnaryOpNode:
+    __slots__ = ('operator', 'operand')
+    _fields = ('operator', 'operand')
+    
     def __init__(self, operator, operand):
         self.operator = operator
         self.operand = operand
 
 class IfNode:
+    __slots__ = ('condition', 'then_body', 'else_body')
+    _fields = ('condition', 'then_body', 'else_body')
+    
     def __init__(self, condition, then_body, else_body=None):
         self.condition = condition
         self.then_body = then_body
         self.else_body = else_body
 
 class WhileNode:
+    __slots__ = ('condition', 'body')
+    _fields = ('condition', 'body')
+    
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
 
 class ReturnNode:
+    __slots__ = ('expression',)
+    _fields = ('expression',)
+    
     def __init__(self, expression=None):
         self.expression = expression
 
 class PrintNode:
+    __slots__ = ('expression',)
+    _fields = ('expression',)
+    
     def __init__(self, expression):
         self.expression = expression
 
 class VariableNode:
+    __slots__ = ('name',)
+    _fields = ('name',)
+    
     def __init__(self, name):
         self.name = name
 
 class StringNode:
+    __slots__ = ('value',)
+    _fields = ('value',)
+    
     def __init__(self, value):
         self.value = value
 
 class NumberNode:
+    __slots__ = ('value',)
+    _fields = ('value',)
+    
     def __init__(self, value):
         self.value = value
 
 class BooleanNode:
+    __slots__ = ('value',)
+    _fields = ('value',)
+    
     def __init__(self, value):
         self.value = value
 
+# Stateless nodes are shared: every NullNode() / SuperNode() is the same
+# instance.
 class NullNode:
-    def __init__(self):
-        self.value = None
+    __slots__ = ()
+    _fields = ()
+    _instance = None
+    value = None
+    
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
 
 class ExtendsNode:
+    __slots__ = ('parent_class',)
+    _fields = ('parent_class',)
+    
     def __init__(self, parent_class):
         self.parent_class = parent_class
 
 class SuperNode:
-    def __init__(self):
-        pass
\ No newline at end of file
+    __slots__ = ()
+    _fields = ()
+    _instance = None
+    
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+# A variable the resolver found in a method's frame: slot indexes the
+# frame's values, and name is kept for the fallback lookup while the slot
+# is still unassigned.
+class LocalNode:
+    __slots__ = ('name', 'slot')
+    _fields = ('name', 'slot')
+    
+    def __init__(self, name, slot):
+        self.name = name
+        self.slot = slot
+
+# Every node type in a fixed order; a class's index here is its kind code
+# in serialised ASTs.
+NODE_TYPES = (
+    ClassNode, MethodNode, MethodCallNode, ObjectCreateNode,
+    PropertyAccessNode, AssignmentNode, BinOpNode, UnaryOpNode, IfNode,
+    WhileNode, ReturnNode, PrintNode, VariableNode, StringNode, NumberNode,
+    BooleanNode, NullNode, ExtendsNode, SuperNode, LocalNode,
+)
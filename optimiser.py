@@ -0,0 +1,158 @@
+from nodes import *
+
+CONSTANT_NODES = (NumberNode, StringNode, BooleanNode, NullNode)
+
+# Folding must not build huge values at parse time (e.g. "x" * 1000000000
+# in a branch that never runs)
+MAX_FOLDED_STRING = 1024
+
+
+def constant_node(value):
+    if value is None:
+        return NullNode()
+    if isinstance(value, bool):
+        return BooleanNode(value)
+    if isinstance(value, (int, float)):
+        return NumberNode(value)
+    if isinstance(value, str) and len(value) <= MAX_FOLDED_STRING:
+        return StringNode(value)
+    return None
+
+
+class Optimiser:
+    # Folds constant BinOpNode/UnaryOpNode subtrees and drops IfNode and
+    # WhileNode bodies whose condition is a constant. Operators are
+    # evaluated with the interpreter's own binary_op/unary_op/is_truthy, and
+    # anything that raises (division by zero, str + int, ...) is left in
+    # place so the error still happens at run time. Returns new nodes and
+    # leaves the input tree untouched.
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.stats = {'folded': 0, 'branches_removed': 0, 'loops_removed': 0}
+
+    def optimise(self, nodes):
+        # Expressions are walked without recursion; blocks nest no deeper
+        # than the parser managed to recurse, but should they still run out
+        # of stack the program runs unoptimised.
+        try:
+            return self.optimise_block(nodes)
+        except RecursionError:
+            return nodes
+
+    def optimise_block(self, statements, in_class=False):
+        result = []
+        for stmt in statements:
+            if isinstance(stmt, IfNode):
+                condition = self.optimise_expression(stmt.condition)
+                if isinstance(condition, CONSTANT_NODES):
+                    truthy = self.interpreter.is_truthy(condition.value)
+                    live = stmt.then_body if truthy else stmt.else_body
+                    # A class body only picks up its direct assignments and
+                    # methods, so a taken branch cannot be inlined there.
+                    if not in_class or not live:
+                        self.stats['branches_removed'] += 1
+                        if live:
+                            result.extend(self.optimise_block(live))
+                        continue
+                result.append(IfNode(condition, self.optimise_block(stmt.then_body),
+                                     self.optimise_block(stmt.else_body) if stmt.else_body else stmt.else_body))
+            elif isinstance(stmt, WhileNode):
+                condition = self.optimise_expression(stmt.condition)
+                if isinstance(condition, CONSTANT_NODES) and not self.interpreter.is_truthy(condition.value):
+                    self.stats['loops_removed'] += 1
+                    continue
+                result.append(WhileNode(condition, self.optimise_block(stmt.body)))
+            else:
+                result.append(self.optimise_statement(stmt))
+        return result
+
+    def optimise_statement(self, stmt):
+        if isinstance(stmt, ClassNode):
+            return ClassNode(stmt.name, self.optimise_block(stmt.body, in_class=True), stmt.parent_class)
+        if isinstance(stmt, MethodNode):
+            return MethodNode(stmt.name, stmt.parameters, self.optimise_block(stmt.body))
+        if isinstance(stmt, AssignmentNode):
+            return AssignmentNode(self.optimise_expression(stmt.target), self.optimise_expression(stmt.value))
+        if isinstance(stmt, ReturnNode):
+            return ReturnNode(self.optimise_expression(stmt.expression))
+        if isinstance(stmt, PrintNode):
+            return PrintNode(self.optimise_expression(stmt.expression))
+        return self.optimise_expression(stmt)
+
+    def optimise_expression(self, node):
+        # Post-order over an explicit stack, so operator chains of any
+        # length are folded without recursing: a node is expanded into its
+        # operands, then rebuilt from their optimised forms on results.
+        results = []
+        stack = [(node, None)]
+        while stack:
+            node, operands = stack.pop()
+            if operands is None:
+                operands = self.operands(node)
+                if operands:
+                    stack.append((node, operands))
+                    stack.extend((operand, None) for operand in reversed(operands))
+                else:
+                    results.append(self.rebuild(node, operands))
+                continue
+            values = results[len(results) - len(operands):]
+            del results[len(results) - len(operands):]
+            results.append(self.rebuild(node, values))
+        return results[0]
+
+    def operands(self, node):
+        if isinstance(node, BinOpNode):
+            return [node.left, node.right]
+        if isinstance(node, UnaryOpNode):
+            return [node.operand]
+        if isinstance(node, MethodCallNode):
+            return [node.object] + node.arguments
+        if isinstance(node, PropertyAccessNode):
+            return [node.object]
+        return []
+
+    def rebuild(self, node, values):
+        # node with its operands replaced by their optimised values
+        if isinstance(node, BinOpNode):
+            left, right = values
+            if isinstance(left, CONSTANT_NODES) and isinstance(right, CONSTANT_NODES) \
+                    and not self.too_large(node.operator, left.value, right.value):
+                folded = self.fold(self.interpreter.binary_op, node.operator, left.value, right.value)
+                if folded is not None:
+                    return folded
+            if left is node.left and right is node.right:
+                return node
+            return BinOpNode(left, node.operator, right)
+        if isinstance(node, UnaryOpNode):
+            operand = values[0]
+            if isinstance(operand, CONSTANT_NODES):
+                folded = self.fold(self.interpreter.unary_op, node.operator, operand.value)
+                if folded is not None:
+                    return folded
+            if operand is node.operand:
+                return node
+            return UnaryOpNode(node.operator, operand)
+        if isinstance(node, MethodCallNode):
+            return MethodCallNode(values[0], node.method_name, values[1:])
+        if isinstance(node, PropertyAccessNode):
+            return PropertyAccessNode(values[0], node.property)
+        return node
+
+    def too_large(self, op, left, right):
+        if op != '*':
+            return False
+        if isinstance(left, str) and isinstance(right, int):
+            return len(left) * right > MAX_FOLDED_STRING
+        if isinstance(right, str) and isinstance(left, int):
+            return len(right) * left > MAX_FOLDED_STRING
+        return False
+
+    def fold(self, operation, *operands):
+        try:
+            value = operation(*operands)
+        except Exception:
+            return None
+        node = constant_node(value)
+        if node is not None:
+            self.stats['folded'] += 1
+        return node
@@ -0,0 +1,88 @@
+import sys
+
+# Characters a BufferedSink holds before writing them out in one go
+FLUSH_SIZE = 8192
+
+
+# Where an interpreter's print statements and error reports go. A sink
+# takes whole lines without their newline through write_line. interpret()
+# flushes it when a program finishes but never closes it, since a sink can
+# outlive one run: whoever creates a sink calls close(), or uses a
+# BufferedSink or FileSink as a context manager.
+
+class BufferedSink:
+    # Joins lines into one write once flush_size characters are waiting.
+    # Without a stream it writes to whatever sys.stdout is when flushing.
+    def __init__(self, stream=None, flush_size=FLUSH_SIZE):
+        self.stream = stream
+        self.flush_size = flush_size
+        self.lines = []
+        self.size = 0
+
+    def write_line(self, text):
+        self.lines.append(text)
+        self.size += len(text) + 1
+        if self.size >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            stream = self.stream or sys.stdout
+            self.lines.append('')
+            stream.write('\n'.join(self.lines))
+            stream.flush()
+            self.lines = []
+            self.size = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FileSink(BufferedSink):
+    # A BufferedSink over a file path or an open file descriptor. A path
+    # is opened here and closed by close(); a descriptor is left open.
+    def __init__(self, target, flush_size=FLUSH_SIZE, encoding='utf-8'):
+        super().__init__(open(target, 'w', encoding=encoding, closefd=not isinstance(target, int)), flush_size)
+
+    def close(self):
+        self.flush()
+        self.stream.close()
+
+
+class CollectingSink:
+    # Keeps every line in memory; getvalue() returns them as printed text
+    def __init__(self):
+        self.lines = []
+
+    def write_line(self, text):
+        self.lines.append(text)
+
+    def getvalue(self):
+        return ''.join(line + '\n' for line in self.lines)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class CallbackSink:
+    # Hands each line to callback(text) as it is printed
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write_line(self, text):
+        self.callback(text)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
@@ -1,4 +1,6 @@
+from bisect import bisect_left
 from Tokeniser import *
+from Lexer import Lexer, edit_range
 from nodes import *
 
 class ParseError(Exception):
@@ -7,37 +9,125 @@ class ParseError(Exception):
         self.token = token
         super().__init__(self.message)
 
+# Binding power of each binary operator token; prefix '-', 'not' and '!'
+# bind tighter than all of them, and '.' member access tighter still.
+BINARY_PRECEDENCE = {
+    OR: 1, AND: 2, EQ: 3, NE: 3, LT: 4, GT: 4, LE: 4, GE: 4,
+    PLUS: 5, MINUS: 5, MULTIPLY: 6, DIVIDE: 6
+}
+UNARY_OPERATORS = (MINUS, NOT)
+UNARY_PRECEDENCE = 7
+PAREN = None
+
+class Block:
+    # A top-level statement and the source span it was parsed from; node is
+    # None and error set when the statement failed to parse.
+    __slots__ = ('start', 'end', 'node', 'error')
+    
+    def __init__(self, start, end, node, error=None):
+        self.start = start
+        self.end = end
+        self.node = node
+        self.error = error
+
+def block_start(block):
+    return block.start
+
+def block_end(block):
+    return block.end
+
 class Parser:
     def __init__(self, lexer):
         self.lexer = lexer
-        self.current_token = self.lexer.get_next_token()
+        self.errors = []
+        self.blocks = []
+        self.text = None
+        self.tokens = lexer.tokenize()
+        self.current_token = next(self.tokens)
+        self.last_end = self.current_token.start
     
     def error(self, message="Invalid syntax"):
-        raise ParseError(f"{message} at token {self.current_token}", self.current_token)
+        message = f"{message} at token {self.current_token}"
+        position = self.lexer.position(self.current_token.start)
+        if position:
+            message += f" (line {position[0]}, column {position[1]})"
+        raise ParseError(message, self.current_token)
+    
+    def advance(self):
+        if self.current_token.type != EOF:
+            self.last_end = self.current_token.end
+            self.current_token = next(self.tokens)
     
     def eat(self, token_type):
         if self.current_token.type == token_type:
-            self.current_token = self.lexer.get_next_token()
+            self.advance()
         else:
-            self.error(f"Expected {token_type}, got {self.current_token.type}")
+            self.error(f"Expected {TOKEN_NAMES[token_type]}, got {TOKEN_NAMES[self.current_token.type]}")
     
     def parse(self):
-        nodes = []
+        self.text = self.lexer.text
         while self.current_token.type != EOF:
-            try:
-                node = self.parse_statement()
-                if node:
-                    nodes.append(node)
-            except ParseError as e:
-                print(f"Parse error: {e}")
-                self.synchronize()
-        return nodes
+            block = self.parse_block()
+            self.blocks.append(block)
+            if block.error:
+                self.errors.append(block.error)
+        return [block.node for block in self.blocks if block.node]
+    
+    def parse_block(self):
+        start = self.current_token.start
+        try:
+            node = self.parse_statement()
+        except ParseError as e:
+            self.synchronize()
+            return Block(start, self.last_end, None, e)
+        return Block(start, self.last_end, node)
+    
+    def reparse(self, text, start=None, old_end=None, new_end=None):
+        # Parses an edited version of the program, reusing every top-level
+        # block that lies wholly before or after the edit. Re-parsing starts
+        # after the last intact block before the edit and stops at the first
+        # statement boundary past it that lines up with an old block, from
+        # where the old blocks are kept with shifted spans. Blocks after a
+        # parse error are never reused, so reported errors stay current.
+        if start is None:
+            start, old_end, new_end = edit_range(self.text, text)
+        delta = new_end - old_end
+        old = self.blocks
+        first = bisect_left(old, start, key=block_end)
+        while first and old[first - 1].error:
+            first -= 1
+        reusable = len(old)
+        while reusable and not old[reusable - 1].error:
+            reusable -= 1
+        candidate = max(bisect_left(old, old_end, key=block_start), reusable, first)
+        
+        lexer = Lexer(text)
+        lexer.pos = old[first - 1].end if first else 0
+        parser = Parser(lexer)
+        fresh = []
+        tail = []
+        while parser.current_token.type != EOF:
+            position = parser.current_token.start
+            if position >= new_end:
+                while candidate < len(old) and old[candidate].start + delta < position:
+                    candidate += 1
+                if candidate < len(old) and old[candidate].start + delta == position:
+                    tail = [Block(block.start + delta, block.end + delta, block.node, block.error)
+                            for block in old[candidate:]]
+                    break
+            fresh.append(parser.parse_block())
+        
+        self.lexer = lexer
+        self.text = text
+        self.blocks = old[:first] + fresh + tail
+        self.errors = [block.error for block in self.blocks if block.error]
+        return [block.node for block in self.blocks if block.node]
     
     def synchronize(self):
-        while self.current_token.type not in [SEMI, CLASS, PRINT, IF, WHILE, EOF]:
-            self.current_token = self.lexer.get_next_token()
+        while self.current_token.type not in (SEMI, CLASS, PRINT, IF, WHILE, EOF):
+            self.advance()
         if self.current_token.type == SEMI:
-            self.current_token = self.lexer.get_next_token()
+            self.advance()
     
     def parse_statement(self):
         if self.current_token.type == CLASS:
@@ -50,6 +140,8 @@ class Parser:
             return self.parse_return()
         elif self.current_token.type == PRINT:
             return self.parse_print()
+        elif self.current_token.type == FUNCTION:
+            return self.parse_function()
         elif self.current_token.type == IDENTIFIER:
             return self.parse_assignment_or_expression()
         else:
@@ -78,6 +170,30 @@ class Parser:
         self.eat(RBRACE)
         return ClassNode(name, body, parent_class)
     
+    def parse_function(self):
+        self.eat(FUNCTION)
+        name = self.current_token.value
+        self.eat(IDENTIFIER)
+        self.eat(LPAREN)
+        
+        parameters = []
+        while self.current_token.type != RPAREN:
+            parameters.append(self.current_token.value)
+            self.eat(IDENTIFIER)
+            if self.current_token.type == COMMA:
+                self.eat(COMMA)
+        self.eat(RPAREN)
+        self.eat(LBRACE)
+        
+        body = []
+        while self.current_token.type != RBRACE:
+            stmt = self.parse_statement()
+            if stmt:
+                body.append(stmt)
+        
+        self.eat(RBRACE)
+        return MethodNode(name, parameters, body)
+    
     def parse_if(self):
         self.eat(IF)
         self.eat(LPAREN)
@@ -137,86 +253,59 @@ class Parser:
         return PrintNode(expr)
     
     def parse_expression(self):
-        return self.parse_logical_or()
-    
-    def parse_logical_or(self):
-        expr = self.parse_logical_and()
-        
-        while self.current_token.type == OR:
-            op = self.current_token.value
-            self.eat(OR)
-            right = self.parse_logical_and()
-            expr = BinOpNode(expr, op, right)
+        # Precedence climbing over explicit operand/operator stacks, so
+        # long operator chains and deeply nested parentheses use no Python
+        # recursion. Operator stack entries are (precedence, operator,
+        # arity); open parentheses are pushed as PAREN.
+        operands = []
+        operators = []
+        open_parens = 0
         
-        return expr
-    
-    def parse_logical_and(self):
-        expr = self.parse_equality()
-        
-        while self.current_token.type == AND:
-            op = self.current_token.value
-            self.eat(AND)
-            right = self.parse_equality()
-            expr = BinOpNode(expr, op, right)
-        
-        return expr
-    
-    def parse_equality(self):
-        expr = self.parse_comparison()
-        
-        while self.current_token.type in [EQ, NE]:
-            op = self.current_token.value
-            self.eat(self.current_token.type)
-            right = self.parse_comparison()
-            expr = BinOpNode(expr, op, right)
-        
-        return expr
-    
-    def parse_comparison(self):
-        expr = self.parse_addition()
-        
-        while self.current_token.type in [LT, GT, LE, GE]:
-            op = self.current_token.value
-            self.eat(self.current_token.type)
-            right = self.parse_addition()
-            expr = BinOpNode(expr, op, right)
-        
-        return expr
-    
-    def parse_addition(self):
-        expr = self.parse_multiplication()
-        
-        while self.current_token.type in [PLUS, MINUS]:
-            op = self.current_token.value
-            self.eat(self.current_token.type)
-            right = self.parse_multiplication()
-            expr = BinOpNode(expr, op, right)
-        
-        return expr
-    
-    def parse_multiplication(self):
-        expr = self.parse_unary()
-        
-        while self.current_token.type in [MULTIPLY, DIVIDE]:
-            op = self.current_token.value
-            self.eat(self.current_token.type)
-            right = self.parse_unary()
-            expr = BinOpNode(expr, op, right)
-        
-        return expr
+        while True:
+            token_type = self.current_token.type
+            if token_type in UNARY_OPERATORS:
+                operators.append((UNARY_PRECEDENCE, self.current_token.value, 1))
+                self.advance()
+                continue
+            if token_type == LPAREN:
+                operators.append(PAREN)
+                open_parens += 1
+                self.advance()
+                continue
+            operands.append(self.parse_postfix(self.parse_primary()))
+            
+            while True:
+                precedence = BINARY_PRECEDENCE.get(self.current_token.type)
+                if precedence is not None:
+                    # All binary operators are left-associative
+                    while operators and operators[-1] is not PAREN and operators[-1][0] >= precedence:
+                        self.reduce(operands, operators.pop())
+                    operators.append((precedence, self.current_token.value, 2))
+                    self.advance()
+                    break
+                if self.current_token.type == RPAREN and open_parens:
+                    while operators[-1] is not PAREN:
+                        self.reduce(operands, operators.pop())
+                    operators.pop()
+                    open_parens -= 1
+                    self.advance()
+                    operands[-1] = self.parse_postfix(operands[-1])
+                    continue
+                if open_parens:
+                    self.eat(RPAREN)
+                while operators:
+                    self.reduce(operands, operators.pop())
+                return operands[0]
     
-    def parse_unary(self):
-        if self.current_token.type in [MINUS, NOT]:
-            op = self.current_token.value
-            self.eat(self.current_token.type)
-            expr = self.parse_unary()
-            return UnaryOpNode(op, expr)
-        
-        return self.parse_postfix()
+    def reduce(self, operands, operator):
+        precedence, op, arity = operator
+        if arity == 1:
+            operands[-1] = UnaryOpNode(op, operands[-1])
+        else:
+            right = operands.pop()
+            operands[-1] = BinOpNode(operands[-1], op, right)
     
-    def parse_postfix(self):
-        expr = self.parse_primary()
-        
+    def parse_postfix(self, expr):
         while True:
             if self.current_token.type == DOT:
                 self.eat(DOT)
@@ -273,15 +362,9 @@ class Parser:
             self.eat(IDENTIFIER)
             return VariableNode(name)
         
-        elif self.current_token.type == LPAREN:
-            self.eat(LPAREN)
-            expr = self.parse_expression()
-            self.eat(RPAREN)
-            return expr
-        
         elif self.current_token.type == SUPER:
             self.eat(SUPER)
             return SuperNode()
             
         else:
-            self.error(f"Unexpected token in expression: {self.current_token.type}")
\ No newline at end of file
+            self.error(f"Unexpected token in expression: {TOKEN_NAMES[self.current_token.type]}")
\ No newline at end of file
@@ -0,0 +1,99 @@
+import time
+
+# Frame the top-level statements run in
+MAIN = '<main>'
+
+
+def describe(node):
+    # A short label for a statement in a loop body
+    kind = type(node).__name__
+    if kind.endswith('Node'):
+        kind = kind[:-4]
+    target = getattr(node, 'target', None)
+    if target is not None:
+        return f"{kind} {getattr(target, 'name', None) or getattr(target, 'property', '')}".rstrip()
+    name = getattr(node, 'method_name', None) or getattr(node, 'name', None)
+    return f"{kind} {name}" if name else kind
+
+
+class Profiler:
+    # What Interpreter.enable_profiling records while a program runs.
+    #
+    # methods maps "Class.method" (the class that defines it; plain
+    # functions go by their name) to [calls, inclusive, exclusive] seconds.
+    # Inclusive time is only added by the outermost of recursive calls, so
+    # it never exceeds the time the program ran.
+    #
+    # Every distinct call path gets an id in paths, (parent id, name) ->
+    # id, with its exclusive time in path_times; collapsed() turns them
+    # into the "a;b;c value" lines flame-graph tools read.
+    #
+    # loops keeps, per WhileNode in order of first run, the frame it ran
+    # in and how often each statement of its body started.
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.methods = {}
+        self.paths = {}
+        self.path_keys = []
+        self.path_times = []
+        self.loops = {}
+        # [name, path id, start, time spent in callees] per active call
+        self.stack = []
+        self.active = {}
+
+    def enter(self, name):
+        stack = self.stack
+        parent = stack[-1][1] if stack else -1
+        path = self.paths.get((parent, name))
+        if path is None:
+            path = self.paths[(parent, name)] = len(self.path_keys)
+            self.path_keys.append((parent, name))
+            self.path_times.append(0.0)
+        self.active[name] = self.active.get(name, 0) + 1
+        stack.append([name, path, self.clock(), 0.0])
+
+    def exit(self):
+        name, path, start, callees = self.stack.pop()
+        elapsed = self.clock() - start
+        stats = self.methods.get(name)
+        if stats is None:
+            stats = self.methods[name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[2] += elapsed - callees
+        self.path_times[path] += elapsed - callees
+        depth = self.active[name] - 1
+        self.active[name] = depth
+        if depth == 0:
+            stats[1] += elapsed
+        if self.stack:
+            self.stack[-1][3] += elapsed
+
+    def loop_hits(self, node):
+        # The hit counters of a loop's body statements
+        entry = self.loops.get(id(node))
+        if entry is None:
+            frame = self.stack[-1][0] if self.stack else MAIN
+            entry = self.loops[id(node)] = (node, frame, [0] * len(node.body))
+        return entry[2]
+
+    def report(self, limit=None):
+        lines = [f"{'method':<32} {'calls':>9} {'inclusive ms':>13} {'exclusive ms':>13}"]
+        ranked = sorted(self.methods.items(), key=lambda item: item[1][2], reverse=True)
+        for name, (calls, inclusive, exclusive) in ranked[:limit]:
+            lines.append(f"{name:<32} {calls:>9} {inclusive * 1000:>13.3f} {exclusive * 1000:>13.3f}")
+        numbers = {}
+        for node, frame, hits in self.loops.values():
+            numbers[frame] = numbers.get(frame, 0) + 1
+            lines.append('')
+            lines.append(f"{frame} while #{numbers[frame]} ({hits[0] if hits else 0} iterations)")
+            for index, (stmt, count) in enumerate(zip(node.body, hits)):
+                lines.append(f"  {count:>9}  {index + 1:>3}. {describe(stmt)}")
+        return '\n'.join(lines)
+
+    def collapsed(self):
+        # "main;Class.method;... microseconds" per call path, heaviest first
+        names = []
+        for parent, name in self.path_keys:
+            names.append(name if parent < 0 else f"{names[parent]};{name}")
+        ranked = sorted(zip(names, self.path_times), key=lambda item: item[1], reverse=True)
+        return ''.join(f"{name} {round(seconds * 1e6)}\n" for name, seconds in ranked if seconds > 0)
@@ -0,0 +1,94 @@
+from nodes import BinOpNode
+
+
+# A BinOpNode the tree walker has run once is rewritten in place, by
+# swapping its class, into one of the forms below. The subclasses add no
+# slots, so the swap keeps every field and the node still reads as a
+# BinOpNode everywhere else; only the dispatch table tells them apart.
+
+class QuickenedBinOpNode(BinOpNode):
+    # Both operands were of one type the operator has a fast path for.
+    # The handler checks that they still are and otherwise deoptimises.
+    __slots__ = ()
+
+
+class GenericBinOpNode(BinOpNode):
+    # No fast path fits, or a guard failed once; always runs binary_op
+    # and is never specialised again.
+    __slots__ = ()
+
+
+class IntAddNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+class IntSubtractNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+class IntMultiplyNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+class IntLessNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+class IntLessEqualNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+class IntGreaterNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+class IntGreaterEqualNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+class IntEqualNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+class IntNotEqualNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+class FloatAddNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+class FloatSubtractNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+class FloatMultiplyNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+class FloatLessNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+class StrAddNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+class StrEqualNode(QuickenedBinOpNode):
+    __slots__ = ()
+
+
+# (operator, operand type) -> specialised form. Guards compare types with
+# `is`, so True and False (bools) never take an int path.
+SPECIALISATIONS = {
+    ('+', int): IntAddNode,
+    ('-', int): IntSubtractNode,
+    ('*', int): IntMultiplyNode,
+    ('<', int): IntLessNode,
+    ('<=', int): IntLessEqualNode,
+    ('>', int): IntGreaterNode,
+    ('>=', int): IntGreaterEqualNode,
+    ('==', int): IntEqualNode,
+    ('!=', int): IntNotEqualNode,
+    ('+', float): FloatAddNode,
+    ('-', float): FloatSubtractNode,
+    ('*', float): FloatMultiplyNode,
+    ('<', float): FloatLessNode,
+    ('+', str): StrAddNode,
+    ('==', str): StrEqualNode,
+}
+
+QUICKENED_NODES = (GenericBinOpNode,) + tuple(SPECIALISATIONS.values())
+
+
+def specialisation(operator, left, right):
+    # The form a node with these operand values becomes
+    if type(left) is not type(right):
+        return GenericBinOpNode
+    return SPECIALISATIONS.get((operator, type(left)), GenericBinOpNode)
@@ -0,0 +1,145 @@
+from nodes import *
+
+
+def frame_names(method):
+    # this, super, the parameters and every variable the body assigns, in
+    # slot order. Class and method definitions nested in the body have
+    # scopes of their own and are not searched.
+    names = ['this', 'super']
+    for name in method.parameters:
+        if name not in names:
+            names.append(name)
+    stack = [stmt for stmt in reversed(method.body) if stmt is not None]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ClassNode, MethodNode)):
+            continue
+        if isinstance(node, AssignmentNode) and isinstance(node.target, VariableNode) \
+                and node.target.name not in names:
+            names.append(node.target.name)
+        for field in reversed(node._fields):
+            value = getattr(node, field)
+            if isinstance(value, list):
+                stack.extend(item for item in reversed(value) if hasattr(item, '_fields'))
+            elif hasattr(value, '_fields'):
+                stack.append(value)
+    return names
+
+
+class Resolver:
+    # Rewrites every variable a method body reads or assigns into a
+    # LocalNode carrying its slot in the method's Frame; the frame layout
+    # is kept in layouts under the rewritten body. Names outside a method's
+    # frame stay VariableNodes and are looked up through the environment
+    # chain, which ends in the globals. Objects pick up their scope from
+    # where they are created, so a method's own frame is the only scope
+    # known before running and every address is in the innermost frame.
+    #
+    # A name that is read somewhere but never assigned, passed as a
+    # parameter or defined before the run cannot be found at run time and
+    # is reported in errors. Returns new nodes and leaves the input
+    # untouched.
+    def __init__(self):
+        self.layouts = {}
+        self.errors = []
+
+    def resolve(self, nodes, defined=(), rewrite=True):
+        self.errors = []
+        self.assigned = set(defined)
+        self.assigned.update(('this', 'super'))
+        self.read = []
+        result = self.resolve_block(nodes, None) if rewrite else nodes
+        self.check(nodes)
+        missing = []
+        for name in self.read:
+            if name not in self.assigned and name not in missing:
+                missing.append(name)
+        self.errors = [f"Undefined variable: {name}" for name in missing]
+        return result
+
+    def check(self, nodes):
+        stack = [node for node in reversed(nodes) if node is not None]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, VariableNode):
+                self.read.append(node.name)
+            elif isinstance(node, AssignmentNode) and isinstance(node.target, VariableNode):
+                self.assigned.add(node.target.name)
+                stack.append(node.value)
+                continue
+            elif isinstance(node, MethodNode):
+                self.assigned.update(node.parameters)
+            for field in reversed(node._fields):
+                value = getattr(node, field)
+                if isinstance(value, list):
+                    stack.extend(item for item in reversed(value) if hasattr(item, '_fields'))
+                elif hasattr(value, '_fields'):
+                    stack.append(value)
+
+    def resolve_block(self, statements, scope):
+        return [self.resolve_node(stmt, scope) for stmt in statements]
+
+    def resolve_node(self, node, scope):
+        # Post-order over an explicit stack, so deep expressions do not
+        # recurse: a node is expanded into its child nodes with the scope
+        # they resolve in, then rebuilt from their results.
+        results = []
+        stack = [(node, scope, None)]
+        while stack:
+            node, scope, children = stack.pop()
+            if children is not None:
+                values = results[len(results) - len(children):]
+                del results[len(results) - len(children):]
+                results.append(self.rebuild(node, scope, values))
+                continue
+            if node is None:
+                results.append(None)
+            elif isinstance(node, VariableNode):
+                if scope is not None and node.name in scope:
+                    results.append(LocalNode(node.name, scope[node.name]))
+                else:
+                    results.append(node)
+            else:
+                if isinstance(node, MethodNode):
+                    # The body resolves in the method's own frame
+                    scope = {name: slot for slot, name in enumerate(frame_names(node))}
+                    children = list(node.body)
+                elif isinstance(node, ClassNode):
+                    # Class bodies run in their own environment, not the frame
+                    scope = None
+                    children = list(node.body)
+                else:
+                    children = []
+                    for field in node._fields:
+                        value = getattr(node, field)
+                        if isinstance(value, list):
+                            children.extend(item for item in value if hasattr(item, '_fields'))
+                        elif hasattr(value, '_fields'):
+                            children.append(value)
+                if not children:
+                    results.append(self.rebuild(node, scope, []))
+                    continue
+                stack.append((node, scope, children))
+                stack.extend((child, scope, None) for child in reversed(children))
+        return results[0]
+
+    def rebuild(self, node, scope, values):
+        # node with its children replaced by their resolved forms, in the
+        # order resolve_node listed them; scope is the one they resolved in
+        if isinstance(node, MethodNode):
+            self.layouts[id(values)] = (values, scope)
+            return MethodNode(node.name, node.parameters, values)
+        if isinstance(node, ClassNode):
+            return ClassNode(node.name, values, node.parent_class)
+        if not node._fields:
+            return node
+        values = iter(values)
+        fields = []
+        for field in node._fields:
+            value = getattr(node, field)
+            if isinstance(value, list):
+                value = [next(values) if hasattr(item, '_fields') else item for item in value]
+            elif hasattr(value, '_fields'):
+                value = next(values)
+            fields.append(value)
+        return type(node)(*fields)
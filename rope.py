@@ -0,0 +1,125 @@
+# Joining two strings into one at least this long makes a Rope instead
+ROPE_THRESHOLD = 256
+
+
+def concat(left, right):
+    # left + right. Two strings that would make a long one start a Rope;
+    # anything else, Ropes included, is Python's own +.
+    if type(left) is str and type(right) is str:
+        length = len(left) + len(right)
+        if length >= ROPE_THRESHOLD:
+            return Rope([left, right], length)
+    return left + right
+
+
+def text(value):
+    return str(value) if type(value) is Rope else value
+
+
+class Rope:
+    # A string built by +, kept as its pieces until something needs the
+    # characters: printing, comparing, hashing or any operator other than
+    # +. A loop of s = s + "..." then copies each piece once instead of
+    # the whole string every iteration.
+    #
+    # Appending shares the parts list: the new rope owns one more entry
+    # than the old one, which still reads only its first count parts. An
+    # append to a rope that is not the newest on its list copies the list.
+    # The joined text is cached. Every other operator works on the text,
+    # so results and errors are those of the equivalent str.
+    __slots__ = ('parts', 'count', 'length', 'flat')
+
+    def __init__(self, parts, length):
+        self.parts = parts
+        self.count = len(parts)
+        self.length = length
+        self.flat = None
+
+    def append(self, piece):
+        parts = self.parts
+        if len(parts) != self.count:
+            parts = parts[:self.count]
+        parts.append(piece)
+        return Rope(parts, self.length + len(piece))
+
+    def head(self, size):
+        # The first size characters, without joining the whole rope
+        if self.flat is not None:
+            return self.flat[:size]
+        pieces = []
+        length = 0
+        for index in range(self.count):
+            pieces.append(self.parts[index])
+            length += len(self.parts[index])
+            if length >= size:
+                break
+        return ''.join(pieces)[:size]
+
+    def __str__(self):
+        if self.flat is None:
+            parts = self.parts
+            self.flat = ''.join(parts if len(parts) == self.count else parts[:self.count])
+        return self.flat
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return self.length > 0
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __add__(self, other):
+        if type(other) is str:
+            return self.append(other) if other else self
+        if type(other) is Rope:
+            return self.append(str(other))
+        return str(self) + other
+
+    def __radd__(self, other):
+        if type(other) is str:
+            return Rope([other, str(self)], len(other) + self.length)
+        return other + str(self)
+
+    def __eq__(self, other):
+        return str(self) == text(other)
+
+    def __ne__(self, other):
+        return str(self) != text(other)
+
+    def __lt__(self, other):
+        return str(self) < text(other)
+
+    def __le__(self, other):
+        return str(self) <= text(other)
+
+    def __gt__(self, other):
+        return str(self) > text(other)
+
+    def __ge__(self, other):
+        return str(self) >= text(other)
+
+    def __sub__(self, other):
+        return str(self) - other
+
+    def __rsub__(self, other):
+        return other - str(self)
+
+    def __mul__(self, other):
+        return str(self) * other
+
+    def __rmul__(self, other):
+        return other * str(self)
+
+    def __truediv__(self, other):
+        return str(self) / other
+
+    def __rtruediv__(self, other):
+        return other / str(self)
+
+    def __neg__(self):
+        return -str(self)
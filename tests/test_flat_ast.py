@@ -0,0 +1,30 @@
+from Lexer import Lexer
+from parser import Parser
+from flat_ast import FlatAST, FlatInterpreter
+from output import CollectingSink
+
+
+def run_flat(source, optimise=True):
+    output = CollectingSink()
+    FlatInterpreter(optimise=optimise, output=output).interpret(Parser(Lexer(source)).parse())
+    return output.getvalue()
+
+
+def test_negative_zero_constant_is_kept():
+    flat = FlatAST()
+    zero = flat.add_const(0.0)
+    negative_zero = flat.add_const(-0.0)
+    assert zero != negative_zero
+    assert repr(flat.consts[negative_zero]) == '-0.0'
+
+
+def test_equal_constants_are_shared():
+    flat = FlatAST()
+    assert flat.add_const(1.5) == flat.add_const(1.5)
+    assert flat.add_const(1) != flat.add_const(1.0)
+
+
+def test_print_negative_zero():
+    # The optimiser folds -0.0 into a constant next to 0.0
+    assert run_flat("print 0.0;\nprint -0.0;\n") == "0.0\n-0.0\n"
+    assert run_flat("print 0.0;\nprint -0.0;\n", optimise=False) == "0.0\n-0.0\n"
@@ -0,0 +1,39 @@
+import random
+from Lexer import Lexer, IncrementalLexer
+
+PROGRAM = 'a = 1; b = "x"; while (a < 3) { a = a + 1; }\n// note\nprint b;\n' * 4
+INSERTS = ['', 'x', ' ', '"', '/*', '*/', '\n', 'while', '1.5', '==', '//c\n', 'a = "s";', '#']
+
+
+def lexed(text):
+    return [(token.type, token.value, token.start, token.end)
+            for token in Lexer(text, strict=False).tokenize_all()[:-1]]
+
+
+def test_random_edits_match_a_fresh_lex():
+    # Checks offsets through start_of/end_of, which see the pending shift,
+    # and now and then through tokens, which settles it
+    for seed in range(20):
+        rng = random.Random(seed)
+        lexer = IncrementalLexer(PROGRAM)
+        text = PROGRAM
+        for _ in range(80):
+            start = rng.randint(0, len(text))
+            end = min(len(text), start + rng.choice([0, 0, 1, 3, 10]))
+            text = text[:start] + rng.choice(INSERTS) + text[end:]
+            first, last = lexer.update(text)
+            expected = lexed(text)
+            assert [(token.type, token.value, lexer.start_of(index), lexer.end_of(index))
+                    for index, token in enumerate(lexer.slice(0, first))] == expected[:first]
+            assert [(lexer.start_of(index), lexer.end_of(index)) for index in range(len(lexer))] \
+                == [(start, end) for _, _, start, end in expected]
+            if rng.random() < 0.1:
+                assert [(token.type, token.value, token.start, token.end) for token in lexer.tokens] == expected
+        assert [(token.type, token.value, token.start, token.end) for token in lexer.tokens] == lexed(text)
+
+
+def test_update_reports_the_relexed_tokens():
+    lexer = IncrementalLexer('a = 1;\nb = 2;\nc = 3;\n')
+    first, last = lexer.update('a = 1;\nb = 22;\nc = 3;\n')
+    assert [token.value for token in lexer.slice(first, last)] == [22]
+    assert lexer.start_of(last) == 13
@@ -0,0 +1,13 @@
+from Lexer import Lexer
+from parser import Parser
+from interpreter import Interpreter
+from output import FileSink
+
+
+def test_file_sink_closes_its_file(tmp_path):
+    path = tmp_path / 'out.txt'
+    with FileSink(path) as sink:
+        Interpreter(output=sink).interpret(Parser(Lexer("print 1;\nprint \"two\";\n")).parse())
+        assert not sink.stream.closed
+    assert sink.stream.closed
+    assert path.read_text() == "1\ntwo\n"
@@ -0,0 +1,51 @@
+import random
+from Lexer import Lexer
+from parser import Parser
+
+PROGRAM = '''class Counter {
+    count = 0;
+    function add(n) { this.count = this.count + n; return this.count; }
+}
+c = new Counter;
+i = 0;
+while (i < 3) { c.add(i); i = i + 1; }
+if (c.count > 2) { print "big"; } else { print c.count; }
+print c.add(1) * 2;
+'''
+INSERTS = ['', 'x', ' ', ';', '}', '{', '(', ')', '\n', 'print 1;', 'if (a) {', 'while', '+ 2', 'class']
+
+
+def dump(value):
+    if isinstance(value, list):
+        return [dump(item) for item in value]
+    if hasattr(value, '_fields'):
+        return (type(value).__name__,) + tuple(dump(getattr(value, field)) for field in value._fields)
+    return value
+
+
+def parsed(text):
+    parser = Parser(Lexer(text))
+    return dump(parser.parse()), [str(error) for error in parser.errors]
+
+
+def test_random_edits_match_a_fresh_parse():
+    for seed in range(20):
+        rng = random.Random(seed)
+        parser = Parser(Lexer(PROGRAM))
+        parser.parse()
+        text = PROGRAM
+        for _ in range(40):
+            start = rng.randint(0, len(text))
+            end = min(len(text), start + rng.choice([0, 0, 1, 3, 10]))
+            text = text[:start] + rng.choice(INSERTS) + text[end:]
+            nodes = parser.reparse(text)
+            assert (dump(nodes), [str(error) for error in parser.errors]) == parsed(text)
+
+
+def test_reparse_keeps_blocks_outside_the_edit():
+    parser = Parser(Lexer(PROGRAM))
+    before = parser.parse()
+    after = parser.reparse(PROGRAM.replace('i = 0;', 'i = 1;'))
+    assert after[0] is before[0]
+    assert after[-1] is before[-1]
+    assert after[2] is not before[2]
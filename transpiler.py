@@ -0,0 +1,479 @@
+import math
+import sys
+from nodes import *
+from environment import MISSING, UNBOUND
+from interpreter import Interpreter, Completion, ReturnException, RuntimeError, DEPTH_ERROR
+from inline_cache import InlineCache
+from compiler import walk
+from resolver import frame_names
+from rope import concat
+
+# CPython's parser and compiler recurse on nesting; statements with deeper
+# expressions, and blocks nested deeper than this, run on the tree walker.
+MAX_EXPRESSION_DEPTH = 100
+MAX_BLOCK_DEPTH = 50
+
+# Top-level statements per generated function; compile() slows down on
+# very long functions
+PROGRAM_CHUNK = 500
+
+PYTHON_OPERATORS = ('+', '-', '*', '==', '!=', '<', '>', '<=', '>=')
+COMPARISONS = ('==', '!=', '<', '>', '<=', '>=')
+
+# Nodes with a Python translation; a method body containing anything else
+# keeps its variables in an Environment so the tree walker can run it.
+NATIVE_NODES = (
+    NumberNode, StringNode, BooleanNode, NullNode, VariableNode, BinOpNode,
+    UnaryOpNode, PropertyAccessNode, MethodCallNode, AssignmentNode, IfNode,
+    WhileNode, ReturnNode, PrintNode,
+)
+
+# Statements whose tree-walked value can be a Completion
+ABRUPT_NODES = (ReturnNode, ClassNode)
+
+
+def expression_depth(node):
+    deepest = 0
+    stack = [(node, 1)]
+    while stack:
+        node, depth = stack.pop()
+        if isinstance(node, list):
+            stack.extend((item, depth) for item in node)
+        elif hasattr(node, '_fields'):
+            deepest = max(deepest, depth)
+            stack.extend((getattr(node, field), depth + 1) for field in node._fields)
+    return deepest
+
+
+def method_nodes(statements):
+    # Every MethodNode in a block, nested blocks and class bodies included
+    stack = list(statements)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, MethodNode):
+            yield node
+            stack.extend(node.body)
+        elif isinstance(node, ClassNode):
+            stack.extend(node.body)
+        elif isinstance(node, IfNode):
+            stack.extend(node.then_body)
+            stack.extend(node.else_body or ())
+        elif isinstance(node, WhileNode):
+            stack.extend(node.body)
+
+
+class Transpiler:
+    # Translates nodes.py trees into the source of a Python module: a
+    # program(E) function for the top level and one function per method
+    # body, called as fn(method, instance, *arguments). Top-level code keeps
+    # its variables in the environment's store, S. A method body becomes a
+    # function with Python locals for this, super, its parameters and the
+    # variables it assigns, unless it creates objects, defines classes or
+    # methods or holds a node without a translation; then it binds an
+    # Environment like the tree walker and uses its store.
+    #
+    # Objects, classes and method lookup go through the Interpreter helpers
+    # the namespace provides, and class and method definitions run on the
+    # tree walker from nodes, so both behave exactly as in Interpreter.
+    def __init__(self):
+        self.nodes = []
+        self.constants = []
+        self.caches = []
+        # Method bodies in function order; function i is method_i
+        self.bodies = []
+        self.lines = []
+
+    def transpile(self, nodes, defined=()):
+        for node in method_nodes(nodes):
+            self.transpile_method(node)
+        self.transpile_program(nodes, defined)
+        return self.source()
+
+    def source(self):
+        return '\n'.join(self.lines) + '\n'
+
+    def transpile_method(self, method):
+        # method is a MethodNode or a Method
+        index = len(self.bodies)
+        self.bodies.append(method.body)
+        parameters = list(method.parameters)
+        slot_mode = len(set(parameters)) == len(parameters) and not {'this', 'super'} & set(parameters) \
+            and all(isinstance(node, NATIVE_NODES) for node in walk(method.body)) \
+            and self.fits(method.body, 1)
+        self.top_level = False
+        self.temps = 0
+
+        if slot_mode:
+            self.locals = {name: self.local_name(name, slot) for slot, name in enumerate(frame_names(method))}
+            arguments = ''.join(f", {self.locals[name]}" for name in parameters)
+            self.line(0, f"def method_{index}(method, instance{arguments}):")
+            self.line(1, f"# {method.name}({', '.join(parameters)})")
+            self.line(1, f"{self.locals['this']}, {self.locals['super']}, E = method.receiver(instance)")
+            if any(isinstance(node, VariableNode) and node.name == 'super' for node in walk(method.body)):
+                # Outside an override super is looked up like any other name
+                self.line(1, f"if {self.locals['super']} is None:")
+                self.line(2, f"{self.locals['super']} = UNBOUND")
+            assigned = [name for name in self.locals if name not in parameters and name not in ('this', 'super')]
+            if assigned:
+                self.line(1, ' = '.join(self.locals[name] for name in assigned) + ' = UNBOUND')
+            self.emit_block(method.body, 1, set(parameters) | {'this'}, None)
+        else:
+            self.locals = None
+            self.line(0, f"def method_{index}(method, instance, *arguments):")
+            self.line(1, f"# {method.name}({', '.join(parameters)})")
+            self.line(1, "E = method.bind(arguments, instance)")
+            self.line(1, "S = E.store")
+            self.line(1, "I.callers.append(I.current_env)")
+            self.line(1, "I.current_env = E")
+            self.line(1, "try:")
+            self.emit_block(method.body, 2, set(parameters) | {'this'}, None)
+            self.line(1, "finally:")
+            self.line(2, "I.current_env = I.callers.pop()")
+        self.lines.append('')
+        return index
+
+    def transpile_program(self, nodes, defined=()):
+        self.top_level = True
+        self.locals = None
+        assigned = set(defined)
+        chunks = range(0, len(nodes), PROGRAM_CHUNK)
+        for start in chunks:
+            self.temps = 0
+            self.line(0, f"def program_{start // PROGRAM_CHUNK}(E):")
+            self.line(1, "S = E.store")
+            self.emit_block(nodes[start:start + PROGRAM_CHUNK], 1, assigned, 'I.result', every=True)
+            self.lines.append('')
+        self.line(0, "def program(E):")
+        for start in chunks:
+            self.line(1, f"program_{start // PROGRAM_CHUNK}(E)")
+        if not nodes:
+            self.line(1, "pass")
+
+    def local_name(self, name, slot):
+        return f"v_{name}" if name.isidentifier() and name.isascii() else f"v{slot}"
+
+    def line(self, depth, text):
+        self.lines.append('    ' * depth + text)
+
+    def temp(self):
+        self.temps += 1
+        return f"t{self.temps}"
+
+    def fits(self, statements, depth):
+        # Whether every statement translates without passing the nesting limits
+        for stmt in statements:
+            if isinstance(stmt, IfNode):
+                if depth >= MAX_BLOCK_DEPTH or expression_depth(stmt.condition) > MAX_EXPRESSION_DEPTH:
+                    return False
+                if not self.fits(stmt.then_body, depth + 1) or not self.fits(stmt.else_body or [], depth + 1):
+                    return False
+            elif isinstance(stmt, WhileNode):
+                if depth >= MAX_BLOCK_DEPTH or expression_depth(stmt.condition) > MAX_EXPRESSION_DEPTH:
+                    return False
+                if not self.fits(stmt.body, depth + 1):
+                    return False
+            elif expression_depth(stmt) > MAX_EXPRESSION_DEPTH:
+                return False
+        return True
+
+    # keep names where a statement's value goes: None drops it; otherwise
+    # it is assigned there, 'I.result' for the program's result or the
+    # pending register p inside a top-level if or while, which is copied to
+    # the result once the statement has finished. With every, each
+    # statement of the block keeps its value, as the top level does.
+    def emit_block(self, statements, depth, assigned, keep, every=False):
+        start = len(self.lines)
+        for index, stmt in enumerate(statements):
+            last = every or index == len(statements) - 1
+            self.emit_statement(stmt, depth, assigned, keep if last else None)
+        if len(self.lines) == start:
+            self.line(depth, "pass")
+
+    def emit_statement(self, node, depth, assigned, keep):
+        if not self.fits([node], depth):
+            self.emit_fallback(node, depth, keep)
+        elif isinstance(node, (IfNode, WhileNode)):
+            inner = None
+            if keep is not None:
+                inner = 'p'
+                self.line(depth, "p = None")
+            if isinstance(node, IfNode):
+                self.line(depth, f"if {self.condition(node.condition, assigned)}:")
+                self.emit_block(node.then_body, depth + 1, set(assigned), inner)
+                if node.else_body:
+                    self.line(depth, "else:")
+                    self.emit_block(node.else_body, depth + 1, set(assigned), inner)
+            else:
+                self.line(depth, f"while {self.condition(node.condition, assigned)}:")
+                self.emit_block(node.body, depth + 1, set(assigned), inner)
+            if keep is not None and keep != 'p':
+                self.line(depth, f"{keep} = p")
+        elif isinstance(node, ReturnNode):
+            value = self.expression(node.expression, assigned) if node.expression else 'None'
+            if self.top_level:
+                self.line(depth, f"raise ReturnException({value})")
+            else:
+                self.line(depth, f"return {value}")
+        elif isinstance(node, AssignmentNode):
+            value = self.expression(node.value, assigned)
+            target = node.target
+            prefix = f"{keep} = " if keep is not None else ''
+            if isinstance(target, VariableNode):
+                self.line(depth, f"{prefix}{self.store(target.name)} = {value}")
+                assigned.add(target.name)
+            elif isinstance(target, PropertyAccessNode):
+                temp = self.temp()
+                self.line(depth, f"{temp} = {value}")
+                obj = self.expression(target.object, assigned)
+                self.line(depth, f"set_property({obj}, {target.property!r}, {temp})")
+                if keep is not None:
+                    self.line(depth, f"{keep} = {temp}")
+            else:
+                self.line(depth, value)
+                self.line(depth, 'raise RuntimeError("Invalid assignment target")')
+        elif isinstance(node, PrintNode):
+            temp = self.temp()
+            self.line(depth, f"{temp} = {self.expression(node.expression, assigned)}")
+            self.line(depth, f"write(stringify({temp}))")
+            if keep is not None:
+                self.line(depth, f"{keep} = {temp}")
+        elif isinstance(node, NATIVE_NODES):
+            value = self.expression(node, assigned)
+            self.line(depth, f"{keep} = {value}" if keep is not None else value)
+        else:
+            self.emit_fallback(node, depth, keep)
+
+    def emit_fallback(self, node, depth, keep):
+        # Class and method definitions, object creation statements and
+        # anything past the nesting limits run on the tree walker
+        temp = self.temp()
+        self.line(depth, f"{temp} = visit({self.node(node)})")
+        if any(isinstance(child, ABRUPT_NODES) for child in walk([node])):
+            self.line(depth, f"if type({temp}) is Completion:")
+            if self.top_level:
+                self.line(depth + 1, f"raise ReturnException({temp}.value)")
+            else:
+                self.line(depth + 1, f"return {temp}.value")
+        if keep is not None:
+            self.line(depth, f"{keep} = {temp}")
+
+    def node(self, node):
+        self.nodes.append(node)
+        return f"N[{len(self.nodes) - 1}]"
+
+    def cache(self, name):
+        self.caches.append(InlineCache(name))
+        return f"C[{len(self.caches) - 1}]"
+
+    def constant(self, value):
+        if value is None or type(value) in (bool, int, str) \
+                or (type(value) is float and math.isfinite(value)):
+            return repr(value)
+        self.constants.append(value)
+        return f"K[{len(self.constants) - 1}]"
+
+    def store(self, name):
+        if self.locals is not None and name in self.locals:
+            return self.locals[name]
+        if self.locals is not None:
+            # Only the method's own frame is assignable from a slot-mode body
+            raise AssertionError(f"unassignable name {name}")
+        return f"S[{name!r}]"
+
+    def load(self, name, assigned):
+        if self.locals is not None:
+            local = self.locals.get(name)
+            if local is None:
+                return f"load(E, {name!r})"
+            if name in assigned:
+                return local
+            return f"({local} if {local} is not UNBOUND else load(E, {name!r}))"
+        if name in assigned:
+            return f"S[{name!r}]"
+        return f"(S[{name!r}] if {name!r} in S else load(E, {name!r}))"
+
+    def condition(self, node, assigned):
+        # Comparisons, and, not and ! give bools already
+        value = self.expression(node, assigned)
+        if isinstance(node, BinOpNode) and (node.operator in COMPARISONS or node.operator == 'and'):
+            return value
+        if isinstance(node, UnaryOpNode) and node.operator in ('not', '!'):
+            return value
+        return f"truthy({value})"
+
+    def expression(self, node, assigned):
+        if isinstance(node, (NumberNode, StringNode, BooleanNode)):
+            return self.constant(node.value)
+        if isinstance(node, NullNode):
+            return 'None'
+        if isinstance(node, VariableNode):
+            return self.load(node.name, assigned)
+        if isinstance(node, BinOpNode):
+            left = self.expression(node.left, assigned)
+            right = self.expression(node.right, assigned)
+            op = node.operator
+            if op == '+' and (isinstance(node.left, StringNode) or isinstance(node.right, StringNode)):
+                # String building can start a Rope
+                return f"concat({left}, {right})"
+            if op in PYTHON_OPERATORS:
+                return f"({left} {op} {right})"
+            if op == '/':
+                if isinstance(node.right, NumberNode) and node.right.value != 0:
+                    return f"({left} / {right})"
+                return f"divide({left}, {right})"
+            if op == 'and':
+                return f"logical_and({left}, {right})"
+            if op == 'or':
+                return f"logical_or({left}, {right})"
+            return f"binary_op({op!r}, {left}, {right})"
+        if isinstance(node, UnaryOpNode):
+            operand = self.expression(node.operand, assigned)
+            if node.operator == '-':
+                return f"(-{operand})"
+            if node.operator in ('not', '!'):
+                return f"(not truthy({operand}))"
+            return f"unary_op({node.operator!r}, {operand})"
+        if isinstance(node, PropertyAccessNode):
+            return f"get_property({self.cache(node.property)}, {self.expression(node.object, assigned)})"
+        if isinstance(node, MethodCallNode):
+            # The method is found before the arguments are evaluated
+            obj = self.expression(node.object, assigned)
+            if self.locals is not None and obj in self.locals.values():
+                receiver = instance = obj
+            else:
+                instance = self.temp()
+                receiver = f"({instance} := {obj})"
+            arguments = ''.join(f", {self.expression(argument, assigned)}" for argument in node.arguments)
+            return f"call(find_method({self.cache(node.method_name)}, {receiver}), {instance}{arguments})"
+        if isinstance(node, ObjectCreateNode):
+            return f"create_object({node.class_name!r})"
+        return f"visit({self.node(node)})"
+
+
+class TranspiledInterpreter(Interpreter):
+    # Runs programs by translating them with Transpiler, compiling the
+    # source with compile() and calling the result, so CPython's own
+    # bytecode runs the loops and arithmetic. The source of the last
+    # program is kept in source; translate() returns it without running.
+    def __init__(self, optimise=False, output=None):
+        # Method variables become Python locals instead of frame slots
+        super().__init__(optimise, resolve=False, quicken=False, output=output)
+        # id(body) -> (body, function); the body is kept so the id stays valid
+        self.functions = {}
+        # Code objects of every generated function, for memory_roots
+        self.generated = set()
+        self.source = None
+        self.result = None
+
+    def translate(self, nodes):
+        if self.optimiser:
+            nodes = self.optimiser.optimise(nodes)
+        return Transpiler().transpile(nodes, self.current_env.store)
+
+    def run(self, nodes):
+        # Like Interpreter.run, a runtime error still returns the value of
+        # the last top-level statement that completed.
+        transpiler = Transpiler()
+        self.source = transpiler.transpile(nodes, self.current_env.store)
+        namespace = self.load_module(transpiler, self.source, '<program>')
+        self.result = None
+        try:
+            namespace['program'](self.current_env)
+        except RuntimeError as e:
+            self.write(f"Runtime Error: {e.message}")
+        except RecursionError:
+            self.write(f"Runtime Error: {DEPTH_ERROR}")
+        return self.result
+
+    def load_module(self, transpiler, source, name):
+        namespace = self.namespace(transpiler)
+        self.inline_caches.extend(transpiler.caches)
+        exec(compile(source, name, 'exec'), namespace)
+        for value in namespace.values():
+            code = getattr(value, '__code__', None)
+            if code is not None and code.co_filename == name:
+                self.generated.add(code)
+        for index, body in enumerate(transpiler.bodies):
+            self.functions[id(body)] = (body, namespace[f"method_{index}"])
+        return namespace
+
+    def memory_roots(self):
+        # Generated functions keep temporaries, and slot-mode methods their
+        # variables, as Python locals; every local of one is a program value
+        roots = super().memory_roots()
+        thread = self.running_thread
+        frame = sys._current_frames().get(thread) if thread is not None else None
+        generated = self.generated
+        while frame is not None:
+            if frame.f_code in generated:
+                roots.extend(list(frame.f_locals.values()))
+            frame = frame.f_back
+        return roots
+
+    def function_for(self, method):
+        # A method whose body was not part of the program, translated alone
+        entry = self.functions.get(id(method.body))
+        if entry is None:
+            transpiler = Transpiler()
+            transpiler.transpile_method(method)
+            self.load_module(transpiler, transpiler.source(), f"<method {method.name}>")
+            entry = self.functions[id(method.body)]
+        return entry[1]
+
+    def namespace(self, transpiler):
+        functions = self.functions
+        function_for = self.function_for
+        is_truthy = self.is_truthy
+        lookup = self.load_name
+
+        def call(method, instance, *arguments):
+            if len(arguments) != len(method.parameters):
+                raise RuntimeError(f"Method {method.name} expects {len(method.parameters)} arguments, got {len(arguments)}")
+            entry = functions.get(id(method.body))
+            function = entry[1] if entry is not None else function_for(method)
+            return function(method, instance, *arguments)
+
+        def divide(left, right):
+            if right == 0:
+                raise RuntimeError("Division by zero")
+            return left / right
+
+        # Both operands are always evaluated, as in Interpreter.binary_op
+        def logical_and(left, right):
+            return is_truthy(left) and is_truthy(right)
+
+        def logical_or(left, right):
+            return left if is_truthy(left) else right
+
+        return {
+            'I': self,
+            'N': transpiler.nodes,
+            'K': transpiler.constants,
+            'C': transpiler.caches,
+            'UNBOUND': UNBOUND,
+            'Completion': Completion,
+            'ReturnException': ReturnException,
+            'RuntimeError': RuntimeError,
+            'visit': self.visit,
+            'load': lookup,
+            'call': call,
+            'find_method': self.cached_method,
+            'get_property': self.cached_property,
+            'set_property': self.set_property,
+            'create_object': self.create_object,
+            'binary_op': self.binary_op,
+            'concat': concat,
+            'unary_op': self.unary_op,
+            'divide': divide,
+            'logical_and': logical_and,
+            'logical_or': logical_or,
+            'truthy': is_truthy,
+            'stringify': self.stringify,
+            'write': self.write,
+        }
+
+    def load_name(self, env, name):
+        value = env.find(name)
+        if value is MISSING:
+            raise RuntimeError(f"Undefined variable: {name}")
+        return value
@@ -0,0 +1,253 @@
+from compiler import *
+from interpreter import Interpreter, Completion, ReturnException, RuntimeError, DEPTH_ERROR
+
+# Marks a local slot that has not been assigned yet; reading one falls back
+# to a name lookup, the way the tree walker searches the closure chain.
+UNBOUND = object()
+
+# Frames live on the heap, so recursion depth is bounded by this limit, not
+# by Python's recursion limit; VirtualMachine(max_depth=...) overrides it.
+MAX_CALL_DEPTH = 10000
+
+
+class VirtualMachine(Interpreter):
+    # Runs programs compiled by compiler.Compiler. Method calls push a frame
+    # onto a heap list instead of recursing in Python, and return pops it,
+    # so no ReturnException is raised inside methods. Class and method
+    # definitions and object creation reuse the Interpreter helpers, so
+    # objects and environments behave exactly as in the tree walker.
+    def __init__(self, optimise=False, max_depth=MAX_CALL_DEPTH, output=None):
+        # Method variables get slots from the compiler instead
+        super().__init__(optimise, resolve=False, quicken=False, output=output)
+        self.max_depth = max_depth
+        self.compiler = Compiler()
+        # Method bodies are compiled on first call; the body is kept next
+        # to its code so the id stays valid.
+        self.method_code = {}
+        self.result = None
+        # The saved frames of the running execute() and the slots and value
+        # stack of the frame it is in, for memory_roots
+        self.frames = []
+        self.running = ()
+
+    def compile(self, nodes):
+        return self.adopt(self.compiler.compile_program(nodes))
+
+    def code_for(self, method):
+        entry = self.method_code.get(id(method.body))
+        if entry is None:
+            entry = self.method_code[id(method.body)] = (method.body, self.adopt(self.compiler.compile_method(method)))
+        return entry[1]
+
+    def adopt(self, code):
+        # The code object's inline caches count towards cache_stats
+        self.inline_caches.extend(code.caches)
+        return code
+
+    def run(self, nodes):
+        # Like Interpreter.run, a runtime error still returns the value of
+        # the last top-level statement that completed.
+        previous_env = self.current_env
+        self.result = None
+        try:
+            self.execute(self.compile(nodes))
+        except RuntimeError as e:
+            self.write(f"Runtime Error: {e.message}")
+        except RecursionError:
+            # Calls made from initialisers still run on the tree walker
+            self.write(f"Runtime Error: {DEPTH_ERROR}")
+        finally:
+            self.current_env = previous_env
+        return self.result
+
+    def execute(self, program):
+        is_truthy = self.is_truthy
+        write = self.output.write_line
+        max_depth = self.max_depth
+        frames = self.frames = []
+        code = program.code
+        constants = program.constants
+        names = program.names
+        caches = program.caches
+        nodes = program.nodes
+        local_names = program.local_names
+        slots = []
+        env = self.current_env
+        pending = None
+        stack = []
+        self.running = (slots, stack)
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+
+        while True:
+            op, arg = code[pc]
+            pc += 1
+
+            if op == LOAD_NAME:
+                name = names[arg]
+                store = env.store
+                push(store[name] if name in store else self.load_name(env, name))
+            elif op == LOAD_CONST:
+                push(constants[arg])
+            elif op == LOAD_FAST:
+                value = slots[arg]
+                if value is UNBOUND:
+                    value = self.load_name(env, local_names[arg])
+                push(value)
+            elif op == STORE_NAME:
+                env.store[names[arg]] = pop()
+            elif op == STORE_FAST:
+                slots[arg] = pop()
+            elif op == ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+            elif op == LESS:
+                right = pop()
+                stack[-1] = stack[-1] < right
+            elif op == POP_JUMP_IF_FALSE:
+                if not is_truthy(pop()):
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == DUP:
+                push(stack[-1])
+            elif op == STORE_RESULT:
+                if arg:
+                    pending = pop()
+                else:
+                    self.result = pop()
+            elif op == SUBTRACT:
+                right = pop()
+                stack[-1] = stack[-1] - right
+            elif op == MULTIPLY:
+                right = pop()
+                stack[-1] = stack[-1] * right
+            elif op == GET_ATTR:
+                stack[-1] = self.cached_property(caches[arg], stack[-1])
+            elif op == FIND_METHOD:
+                push(self.cached_method(caches[arg], stack[-1]))
+            elif op == CALL:
+                arguments = stack[len(stack) - arg:] if arg else []
+                del stack[len(stack) - arg:]
+                method = pop()
+                instance = pop()
+                if arg != len(method.parameters):
+                    raise RuntimeError(f"Method {method.name} expects {len(method.parameters)} arguments, got {arg}")
+                if len(frames) >= max_depth:
+                    raise RuntimeError(DEPTH_ERROR)
+                callee = self.code_for(method)
+                frames.append((code, constants, names, caches, nodes, local_names, slots, env, stack, pc))
+
+                if callee.uses_env:
+                    env = method.bind(arguments, instance)
+                    slots = []
+                else:
+                    this, super_ref, env = method.receiver(instance)
+                    slots = [UNBOUND] * len(callee.local_names)
+                    slots[THIS_SLOT] = this
+                    if super_ref is not None:
+                        slots[SUPER_SLOT] = super_ref
+                    for slot, value in zip(callee.parameter_slots, arguments):
+                        slots[slot] = value
+                self.current_env = env
+                code = callee.code
+                constants = callee.constants
+                names = callee.names
+                caches = callee.caches
+                nodes = callee.nodes
+                local_names = callee.local_names
+                stack = []
+                self.running = (slots, stack)
+                push = stack.append
+                pop = stack.pop
+                pc = 0
+            elif op == RETURN:
+                value = pop()
+                if not frames:
+                    raise ReturnException(value)
+                code, constants, names, caches, nodes, local_names, slots, env, stack, pc = frames.pop()
+                self.current_env = env
+                self.running = (slots, stack)
+                push = stack.append
+                pop = stack.pop
+                push(value)
+            elif op == POP:
+                pop()
+            elif op == SET_ATTR:
+                obj = pop()
+                self.set_property(obj, names[arg], pop())
+            elif op == GREATER:
+                right = pop()
+                stack[-1] = stack[-1] > right
+            elif op == EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] == right
+            elif op == LESS_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] <= right
+            elif op == GREATER_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] >= right
+            elif op == NOT_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] != right
+            elif op == DIVIDE:
+                right = pop()
+                if right == 0:
+                    raise RuntimeError("Division by zero")
+                stack[-1] = stack[-1] / right
+            elif op == AND:
+                right = pop()
+                stack[-1] = is_truthy(stack[-1]) and is_truthy(right)
+            elif op == OR:
+                right = pop()
+                if not is_truthy(stack[-1]):
+                    stack[-1] = right
+            elif op == NOT:
+                stack[-1] = not is_truthy(stack[-1])
+            elif op == NEGATE:
+                stack[-1] = -stack[-1]
+            elif op == PRINT:
+                write(self.stringify(stack[-1]))
+            elif op == NEW:
+                push(self.create_object(names[arg]))
+            elif op == COMMIT_RESULT:
+                self.result = pending
+            elif op == BINARY_OP:
+                right = pop()
+                stack[-1] = self.binary_op(constants[arg], stack[-1], right)
+            elif op == UNARY_OP:
+                stack[-1] = self.unary_op(constants[arg], stack[-1])
+            elif op == EVAL_NODE:
+                value = self.visit(nodes[arg])
+                if type(value) is Completion:
+                    # A return in a class body the tree walker ran; every
+                    # method's code ends in RETURN
+                    if not frames:
+                        raise ReturnException(value.value)
+                    value = value.value
+                    pc = len(code) - 1
+                push(value)
+            elif op == RAISE_ERROR:
+                raise RuntimeError(constants[arg])
+            elif op == HALT:
+                return self.result
+            else:
+                raise RuntimeError(f"Unknown opcode: {op}")
+
+    def memory_roots(self):
+        # Callers' slots, environments and value stacks wait in the saved
+        # frames, the rest of a frame being compiled code; the running
+        # frame's are in running
+        roots = super().memory_roots()
+        for frame in list(self.frames):
+            roots.extend(frame[6:9])
+        roots.extend(self.running)
+        return roots
+
+    def load_name(self, env, name):
+        try:
+            return env.get(name)
+        except Exception:
+            raise RuntimeError(f"Undefined variable: {name}")